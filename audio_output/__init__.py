@@ -0,0 +1 @@
+"""Implementation of select_audio_output.py."""
@@ -0,0 +1,335 @@
+"""
+Running AppleScript through a long-lived osascript coprocess, and learning
+which variant of a script works on this system.
+"""
+import atexit
+import json
+import os
+import select
+import subprocess
+import threading
+import time
+
+from .cache import load_cache, remove_cache, save_cache
+from .metrics import metrics
+
+metrics.describe("select_audio_output_applescript_variant_attempts_total", "counter",
+                 "AppleScript fallback variants tried, by operation and variant.")
+metrics.describe("select_audio_output_applescript_variant_successes_total", "counter",
+                 "AppleScript fallback variants that succeeded, by operation and variant.")
+
+# Seconds to wait for a single answer from the osascript coprocess
+OSASCRIPT_TIMEOUT = 5.0
+
+# JXA program executed by the long-lived osascript coprocess.
+# It reads one JSON-encoded AppleScript source per line from stdin and answers
+# each with a single line: "OK <result>" or "ERR <message>". Records are
+# rendered the same way `osascript -e` prints them, so callers can parse the
+# output of both execution paths identically.
+_COPROCESS_JXA = r"""
+ObjC.import('Foundation');
+var app = Application.currentApplication();
+app.includeStandardAdditions = true;
+var input = $.NSFileHandle.fileHandleWithStandardInput;
+var output = $.NSFileHandle.fileHandleWithStandardOutput;
+function render(value) {
+    if (value === undefined) return '';
+    if (value === null) return 'missing value';
+    if (typeof value === 'object' && !Array.isArray(value)) {
+        return Object.keys(value).map(function (key) {
+            return key.replace(/([A-Z])/g, ' $1').toLowerCase() + ':' + render(value[key]);
+        }).join(', ');
+    }
+    return String(value);
+}
+function reply(line) {
+    output.writeData($(line.replace(/\n/g, ' ') + '\n').dataUsingEncoding($.NSUTF8StringEncoding));
+}
+var buffer = '';
+while (true) {
+    var data = input.availableData;
+    if (data.length === 0) break;
+    buffer += $.NSString.alloc.initWithDataEncoding(data, $.NSUTF8StringEncoding).js;
+    var newline;
+    while ((newline = buffer.indexOf('\n')) >= 0) {
+        var line = buffer.slice(0, newline);
+        buffer = buffer.slice(newline + 1);
+        if (!line) continue;
+        try {
+            reply('OK ' + render(app.runScript(JSON.parse(line), {in: 'AppleScript'})));
+        } catch (e) {
+            reply('ERR ' + String(e));
+        }
+    }
+}
+"""
+
+
+class CoprocessError(Exception):
+    """
+    Raised when the osascript coprocess cannot be reached or has died.
+    
+    Attributes:
+        delivered (bool): Whether the request had already been written to the
+            coprocess. If so, the script may have run.
+    """
+
+    def __init__(self, message, delivered=False):
+        super().__init__(message)
+        self.delivered = delivered
+
+
+class NoAnswerError(subprocess.SubprocessError):
+    """
+    Raised when a script was sent to osascript but no answer arrived.
+    
+    The script may have run, so it must not be sent again and no other
+    variant of it may be tried.
+    """
+
+
+class OsascriptCoprocess:
+    """
+    A long-lived osascript process that evaluates AppleScript sent over stdin.
+    
+    Spawning osascript costs 80-200 ms on a typical Mac, so all volume and mute
+    queries are routed through a single coprocess that is started lazily on
+    first use and reused for the life of the Python process.
+    
+    Args:
+        command (list): The command line that starts the coprocess. Defaults to
+            running the JXA request loop with the `osascript` found on PATH,
+            which makes it easy to substitute a stand-in script for testing.
+    """
+
+    def __init__(self, command=None):
+        self.command = command or ['osascript', '-l', 'JavaScript', '-e', _COPROCESS_JXA]
+        self.process = None
+        self._buffer = b""
+        self._lock = threading.Lock()
+
+    def _start(self):
+        try:
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            raise CoprocessError(f"could not start osascript: {e}")
+        self._buffer = b""
+
+    def _read_line(self, timeout):
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self._buffer:
+            ready, _, _ = select.select([fd], [], [], timeout)
+            if not ready:
+                raise CoprocessError("timed out waiting for osascript")
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                raise CoprocessError("osascript exited unexpectedly")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line.decode("utf-8", "replace")
+
+    def run(self, source, timeout=None):
+        """
+        Evaluates AppleScript source in the coprocess.
+        
+        Args:
+            source (str): The AppleScript source to evaluate.
+            timeout (float): Seconds to wait for the answer. Defaults to
+                OSASCRIPT_TIMEOUT.
+            
+        Returns:
+            str: The result of the script, rendered like `osascript -e` output.
+            
+        Raises:
+            subprocess.CalledProcessError: If the script itself failed.
+            CoprocessError: If the coprocess is unavailable. The coprocess is
+                discarded and will be restarted on the next call. The
+                `delivered` attribute tells whether the script may have run.
+        """
+        with self._lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            try:
+                self.process.stdin.write(json.dumps(source).encode("utf-8") + b"\n")
+                self.process.stdin.flush()
+            except OSError as e:
+                self._kill()
+                raise CoprocessError(f"could not send the script to osascript: {e}")
+            try:
+                line = self._read_line(OSASCRIPT_TIMEOUT if timeout is None else timeout)
+            except (OSError, CoprocessError) as e:
+                self._kill()
+                raise CoprocessError(str(e), delivered=True)
+        status, _, payload = line.partition(" ")
+        if status == "OK":
+            return payload.strip()
+        if status == "ERR":
+            raise subprocess.CalledProcessError(1, ['osascript', '-e', source], payload, payload)
+        self.close()
+        raise CoprocessError(f"unexpected answer from osascript: {line!r}", delivered=True)
+
+    def _kill(self):
+        if self.process is not None:
+            try:
+                self.process.kill()
+                self.process.wait()
+            except OSError:
+                pass
+            self.process = None
+
+    def close(self):
+        """Stops the coprocess by closing its stdin."""
+        with self._lock:
+            if self.process is None:
+                return
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=1)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+            self._kill()
+
+
+# Shared coprocess instance; None if disabled with SELECT_AUDIO_OUTPUT_COPROCESS=0
+_coprocess = None if os.environ.get("SELECT_AUDIO_OUTPUT_COPROCESS") == "0" else OsascriptCoprocess()
+atexit.register(lambda: _coprocess is not None and _coprocess.close())
+
+
+def run_applescript(source):
+    """
+    Evaluates AppleScript source and returns its output.
+    
+    The source is sent to the shared osascript coprocess. If the script could
+    not be handed to it, the coprocess is restarted once and, failing that,
+    the script runs in a one-shot `osascript -e` process. A script that was
+    handed over but never answered is not sent again, because it may already
+    have run; the coprocess is restarted on the next call.
+    Set SELECT_AUDIO_OUTPUT_COPROCESS=0 to always use one-shot processes.
+    
+    Args:
+        source (str): The AppleScript source to evaluate.
+        
+    Returns:
+        str: The stripped output of the script.
+        
+    Raises:
+        subprocess.CalledProcessError: If the script failed.
+        NoAnswerError: If the script was sent but no answer arrived.
+    """
+    if _coprocess is not None:
+        for attempt in range(2):
+            try:
+                return _coprocess.run(source)
+            except CoprocessError as e:
+                if e.delivered:
+                    raise NoAnswerError(str(e))
+
+    result = subprocess.run(
+        ['osascript', '-e', source],
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True
+    )
+    return result.stdout.strip()
+
+# File that stores which AppleScript variant works best for each operation
+VARIANT_CACHE = "variants.json"
+
+# Learned statistics per operation and variant, loaded lazily
+_variant_stats = None
+
+def run_applescript_variants(operation, variants, parse=None, preferred=None):
+    """
+    Runs the first working AppleScript variant of an operation.
+    
+    Which variant succeeded and how long it took is recorded in a per-user
+    cache file. Later calls try the fastest known working variant first, so
+    systems where only a fallback variant works don't pay for failing
+    attempts on every call.
+    
+    Args:
+        operation (str): Name of the operation, used as the cache key.
+        variants (list): (name, source) pairs in their default order.
+        parse (callable): Converts the script output into the result. If it
+            returns None, the variant is treated as failed.
+        preferred (str): Name of a variant to try before all others.
+            
+    Returns:
+        The (parsed) output of the first working variant, or None if all variants failed.
+        
+    Raises:
+        NoAnswerError: If a variant was sent but never answered. The remaining
+            variants are not tried, since the first one may have run.
+    """
+    global _variant_stats
+    if _variant_stats is None:
+        _variant_stats = load_cache(VARIANT_CACHE) or {}
+    stats = _variant_stats.setdefault(operation, {})
+
+    def rank(variant):
+        if variant[0] == preferred:
+            return (-1, 0.0)
+        record = stats.get(variant[0])
+        if record is None:
+            return (1, 0.0)
+        return (0 if record["ok"] else 2, record["ms"])
+
+    order = sorted(variants, key=rank)
+    changed = False
+    result = None
+    for name, source in order:
+        metrics.inc("select_audio_output_applescript_variant_attempts_total",
+                    operation=operation, variant=name)
+        started = time.monotonic()
+        try:
+            output = run_applescript(source)
+            result = parse(output) if parse else output
+        except subprocess.CalledProcessError:
+            result = None
+        elapsed_ms = (time.monotonic() - started) * 1000
+        metrics.observe("select_audio_output_backend_duration_seconds", elapsed_ms / 1000,
+                        operation=operation)
+        if result is not None:
+            metrics.inc("select_audio_output_applescript_variant_successes_total",
+                        operation=operation, variant=name)
+
+        previous = stats.get(name)
+        if result is not None and previous is not None and previous["ok"]:
+            # Smooth the latency so a single slow call doesn't reorder variants
+            elapsed_ms = 0.7 * previous["ms"] + 0.3 * elapsed_ms
+        stats[name] = {"ok": result is not None, "ms": round(elapsed_ms, 1)}
+        changed = changed or previous is None or previous["ok"] != stats[name]["ok"]
+        if result is not None:
+            break
+
+    # Only write the cache when the outcome or the order of the variants
+    # changed, so the common case costs no file write
+    if changed or sorted(variants, key=rank) != order:
+        save_cache(VARIANT_CACHE, _variant_stats)
+    return result
+
+def best_variant(operation):
+    """
+    Returns the name of the fastest known working variant of an operation.
+    
+    Returns:
+        str: The variant name, or None if no variant is known to work.
+    """
+    working = [
+        (record["ms"], name)
+        for name, record in (_variant_stats or {}).get(operation, {}).items()
+        if record["ok"]
+    ]
+    return min(working)[1] if working else None
+
+def in_system_events(script):
+    """Wraps a multi-line AppleScript in a System Events tell block."""
+    return f'tell application "System Events"\n{script}\nend tell'
+
+def reset_variant_order():
+    """Forgets the learned order of the AppleScript variants."""
+    global _variant_stats
+    _variant_stats = {}
+    remove_cache(VARIANT_CACHE)
@@ -0,0 +1,517 @@
+"""Device listing, volume and mute control through SwitchAudioSource and AppleScript."""
+import collections
+import os
+import subprocess
+import sys
+import time
+
+from .applescript import NoAnswerError, best_variant, in_system_events, run_applescript_variants
+from .cache import load_cache, remove_cache, save_cache
+from .metrics import metrics
+
+# File that caches the list of output devices
+DEVICE_CACHE = "devices.json"
+
+# Seconds a cached device list stays valid (0 disables the cache)
+DEFAULT_DEVICE_CACHE_TTL = float(os.environ.get("SELECT_AUDIO_OUTPUT_CACHE_TTL", "300"))
+device_cache_ttl = DEFAULT_DEVICE_CACHE_TTL
+
+def load_cached_devices():
+    """
+    Returns the cached device list if it is still within the TTL.
+    
+    Returns:
+        list: The cached device names, or None if there is no valid cache.
+    """
+    if device_cache_ttl <= 0:
+        return None
+    cache = load_cache(DEVICE_CACHE)
+    try:
+        if 0 <= time.time() - cache["time"] < device_cache_ttl:
+            metrics.inc("select_audio_output_cache_requests_total", cache="devices", result="hit")
+            return list(cache["devices"])
+    except (TypeError, KeyError):
+        pass
+    metrics.inc("select_audio_output_cache_requests_total", cache="devices", result="miss")
+    return None
+
+def invalidate_device_cache():
+    """Removes the cached device list, e.g. after it turned out to be stale."""
+    remove_cache(DEVICE_CACHE)
+
+def list_devices(use_cache=True):
+    """
+    Return a list of available audio output devices.
+    
+    Uses the SwitchAudioSource command-line tool to get all available output devices.
+    The result is cached on disk for device_cache_ttl seconds.
+    
+    Args:
+        use_cache (bool): Whether a cached device list may be returned.
+    
+    Returns:
+        list: A list of strings containing the names of all available audio output devices.
+    """
+    if use_cache:
+        devices = load_cached_devices()
+        if devices is not None:
+            return devices
+
+    try:
+        with metrics.timer("list"):
+            result = subprocess.run(
+                ['SwitchAudioSource', '-t', 'output', '-a'],
+                check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                text=True
+            )
+    except FileNotFoundError:
+        print("Error: SwitchAudioSource not found. Install via `brew install switchaudio-osx`.", file=sys.stderr)
+        sys.exit(1)
+    except subprocess.CalledProcessError as e:
+        print(f"Error listing devices: {e.stderr}", file=sys.stderr)
+        sys.exit(1)
+
+    # Each line is a device name
+    devices = [line.strip() for line in result.stdout.splitlines() if line.strip()]
+    if device_cache_ttl > 0:
+        save_cache(DEVICE_CACHE, {"time": time.time(), "devices": devices})
+    return devices
+
+def get_current_device():
+    """
+    Determines the currently active audio output device.
+    
+    Returns:
+        str: The name of the current audio output device, or None if it couldn't be determined.
+    """
+    try:
+        with metrics.timer("current"):
+            result = subprocess.run(
+                ['SwitchAudioSource', '-c', '-t', 'output'],
+                check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                text=True
+            )
+        return result.stdout.strip()
+    except subprocess.CalledProcessError:
+        return None
+
+# Snapshot of the AppleScript "volume settings" record. Fields are None when
+# the current output device does not report them ("missing value").
+AudioState = collections.namedtuple(
+    "AudioState", ["output_volume", "input_volume", "alert_volume", "output_muted"]
+)
+
+def parse_volume_settings(text):
+    """
+    Parses the output of `get volume settings` into an AudioState.
+    
+    The record is printed by osascript as
+    "output volume:50, input volume:75, alert volume:100, output muted:false".
+    
+    Args:
+        text (str): The record as printed by osascript.
+        
+    Returns:
+        AudioState: The parsed state, or None if the text is not a volume settings record.
+    """
+    values = {}
+    for item in text.split(","):
+        key, separator, value = item.partition(":")
+        if not separator:
+            continue
+        value = value.strip()
+        if value == "missing value":
+            values[key.strip()] = None
+        elif value in ("true", "false"):
+            values[key.strip()] = (value == "true")
+        else:
+            try:
+                values[key.strip()] = int(float(value))
+            except ValueError:
+                continue
+
+    if "output volume" not in values and "output muted" not in values:
+        return None
+    return AudioState(
+        output_volume=values.get("output volume"),
+        input_volume=values.get("input volume"),
+        alert_volume=values.get("alert volume"),
+        output_muted=values.get("output muted"),
+    )
+
+# File that stores which volume and mute features each device supports
+CAPABILITY_CACHE = "capabilities.json"
+
+# Seconds after which a capability record is probed again
+CAPABILITY_TTL = 24 * 60 * 60
+
+# Capability records per device, loaded lazily
+_capabilities = None
+
+# Current device as looked up for the capability records of this process
+_capability_device = None
+
+def load_capabilities():
+    """
+    Returns the capability records that are still within CAPABILITY_TTL.
+    
+    Returns:
+        dict: Device name -> record with "volume_readable", "volume_settable",
+            "mute_supported", "variant" and "time" entries.
+    """
+    global _capabilities
+    if _capabilities is None:
+        _capabilities = load_cache(CAPABILITY_CACHE) or {}
+    now = time.time()
+    return {
+        device: record for device, record in _capabilities.items()
+        if 0 <= now - record.get("time", 0) < CAPABILITY_TTL
+    }
+
+def capability_device(device=None):
+    """
+    Returns the device that capability records apply to.
+    
+    Args:
+        device (str): The current device, if the caller already knows it.
+        
+    Returns:
+        str: The current audio output device, or None if it couldn't be determined.
+    """
+    global _capability_device
+    if device is not None:
+        _capability_device = device
+    elif _capability_device is None:
+        _capability_device = get_current_device()
+    return _capability_device
+
+def device_supports(capability, device=None):
+    """
+    Checks whether the current device is known not to support a capability.
+    
+    The current device is only looked up if some device is known to lack the
+    capability, so the check is free on systems where everything works.
+    
+    Args:
+        capability (str): "volume_readable", "volume_settable" or "mute_supported".
+        device (str): The current device, if the caller already knows it.
+        
+    Returns:
+        bool: False if the device is known not to support the capability, True otherwise.
+    """
+    records = load_capabilities()
+    if not any(record.get(capability) is False for record in records.values()):
+        return True
+    record = records.get(capability_device(device), {})
+    return record.get(capability) is not False
+
+def record_capabilities(device=None, **capabilities):
+    """
+    Stores which capabilities the current device supports.
+    
+    Successes are only recorded if the current device is already known or a
+    record has to be corrected, so working systems pay no extra lookup.
+    
+    Args:
+        device (str): The current device, if the caller already knows it.
+        **capabilities: Capability names mapped to True or False.
+    """
+    load_capabilities()
+    if device is None and _capability_device is None:
+        if all(capabilities.values()) and not any(
+            record.get(name) is False
+            for record in _capabilities.values() for name in capabilities
+        ):
+            return
+    device = capability_device(device)
+    if device is None:
+        return
+    record = _capabilities.setdefault(device, {})
+    if all(record.get(name) == value for name, value in capabilities.items()) \
+            and time.time() - record.get("time", 0) < CAPABILITY_TTL:
+        return
+    record.update(capabilities)
+    record["time"] = time.time()
+    save_cache(CAPABILITY_CACHE, _capabilities)
+
+def reset_capabilities():
+    """Forgets which volume and mute features each device supports."""
+    global _capabilities
+    _capabilities = {}
+    remove_cache(CAPABILITY_CACHE)
+
+def get_audio_state(device=None):
+    """
+    Reads volume, mute state and alert volume with a single AppleScript call.
+    
+    Args:
+        device (str): The current device, if the caller already knows it.
+    
+    Returns:
+        AudioState: The current audio state, or None if it couldn't be determined.
+    """
+    record = load_capabilities().get(device or _capability_device, {})
+    try:
+        state = run_applescript_variants("get_audio_state", [
+            # Standard command
+            ("standard", 'get volume settings'),
+            # Alternative with System Events
+            ("system_events", 'tell application "System Events" to get volume settings')
+        ], parse=parse_volume_settings, preferred=record.get("variant"))
+    except NoAnswerError:
+        # A script that never answered says nothing about the device's capabilities
+        return None
+
+    capabilities = {
+        "volume_readable": state is not None and state.output_volume is not None,
+        "mute_supported": state is not None and state.output_muted is not None,
+    }
+    if state is not None:
+        capabilities["variant"] = best_variant("get_audio_state")
+    record_capabilities(device, **capabilities)
+    return state
+
+def print_volume_unavailable():
+    """Prints the error message shown when volume control is not available."""
+    print("Volume control is not available on this system.", file=sys.stderr)
+    print("Additional permissions may be required.", file=sys.stderr)
+    print("The device switching functionality is not affected and continues to work.", file=sys.stderr)
+
+def print_mute_unavailable():
+    """Prints the error message shown when mute control is not available."""
+    print("Mute control is not available on this system.", file=sys.stderr)
+    print("Additional permissions may be required.", file=sys.stderr)
+    print("The device switching functionality is not affected and continues to work.", file=sys.stderr)
+
+def get_volume(state=None):
+    """
+    Determines the current volume level (0-100).
+    
+    Args:
+        state (AudioState): An already queried audio state. If omitted, the state
+            is read with get_audio_state().
+    
+    Returns:
+        int: The current volume level (0-100), or None if it couldn't be determined.
+    """
+    try:
+        if state is None:
+            if not device_supports("volume_readable"):
+                print_volume_unavailable()
+                return None
+            state = get_audio_state()
+        if state is not None and state.output_volume is not None:
+            return state.output_volume
+
+        # If the volume could not be read, output an error message
+        print_volume_unavailable()
+        return None
+    except Exception as e:
+        print(f"Error determining volume: {e}", file=sys.stderr)
+        print("The device switching functionality is not affected and continues to work.", file=sys.stderr)
+        return None
+
+def set_volume(level, quiet=False):
+    """
+    Sets the volume to a specific level (0-100).
+    
+    Args:
+        level (int): The volume level to set (0-100).
+        quiet (bool): Don't print the new volume level on success.
+        
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    # Ensure the value is within the valid range
+    level = max(0, min(100, level))
+    
+    if not device_supports("volume_settable"):
+        print_volume_unavailable()
+        return False
+    
+    try:
+        # Try different AppleScript commands to set the volume
+        result = run_applescript_variants("set_volume", [
+            # Standard command
+            ("standard", f'set volume output volume {level}'),
+            # Alternative with System Events
+            ("system_events", f'tell application "System Events" to set volume output volume {level}'),
+            # Simple command (macOS uses 0-10 for simple volume setting)
+            ("simple", f'set volume {level/10}')  # macOS verwendet 0-10 für einfache Lautstärkeeinstellung
+        ])
+        record_capabilities(volume_settable=result is not None)
+        
+        if result is not None:
+            # If no error occurred, the command was successful
+            if not quiet:
+                print(f"Volume set to {level}%")
+            return True
+                
+        # If none of the methods worked, output an error message
+        print_volume_unavailable()
+        return False
+    except Exception as e:
+        print(f"Error setting volume: {e}", file=sys.stderr)
+        print("The device switching functionality is not affected and continues to work.", file=sys.stderr)
+        return False
+
+def parse_applescript_int(text):
+    """
+    Converts an AppleScript number result into a Python int.
+    
+    Returns:
+        int: The value, or None if the text is not a number.
+    """
+    try:
+        return int(float(text))
+    except ValueError:
+        return None
+
+def parse_applescript_bool(text):
+    """
+    Converts an AppleScript boolean result into a Python bool.
+    
+    Returns:
+        bool: The value, or None if the text is not "true" or "false".
+    """
+    return {"true": True, "false": False}.get(text.strip())
+
+# Computes, clamps and applies a relative volume change in one evaluation
+ADJUST_VOLUME_SCRIPT = """set newVolume to (output volume of (get volume settings)) + ({delta})
+if newVolume > 100 then set newVolume to 100
+if newVolume < 0 then set newVolume to 0
+set volume output volume newVolume
+return newVolume"""
+
+def change_volume(delta):
+    """
+    Changes the volume by a specific amount without printing the result.
+    
+    The new level is computed, clamped and applied by a single AppleScript
+    evaluation, so concurrent adjustments add up instead of overwriting each
+    other. If that is not supported, the volume is read and set separately.
+    
+    Args:
+        delta (int): The amount to change the volume by (positive to increase, negative to decrease).
+        
+    Returns:
+        int: The new volume level (0-100), or None if unsuccessful.
+    """
+    if not device_supports("volume_settable"):
+        print_volume_unavailable()
+        return None
+
+    script = ADJUST_VOLUME_SCRIPT.format(delta=int(delta))
+    try:
+        new_volume = run_applescript_variants("adjust_volume", [
+            # Standard command
+            ("standard", script),
+            # Alternative with System Events
+            ("system_events", in_system_events(script))
+        ], parse=parse_applescript_int)
+    except NoAnswerError as e:
+        # The change may have been applied, so it must not be retried
+        print(f"Error adjusting volume: {e}", file=sys.stderr)
+        print("The device switching functionality is not affected and continues to work.", file=sys.stderr)
+        return None
+    if new_volume is not None:
+        record_capabilities(volume_readable=True, volume_settable=True)
+        return new_volume
+
+    current_volume = get_volume()
+    if current_volume is None:
+        print("Volume could not be adjusted because the current volume could not be determined.", file=sys.stderr)
+        print("The device switching functionality is not affected and continues to work.", file=sys.stderr)
+        return None
+    
+    new_volume = max(0, min(100, current_volume + delta))
+    return new_volume if set_volume(new_volume, quiet=True) else None
+
+def adjust_volume(delta):
+    """
+    Increases or decreases the volume by a specific amount.
+    
+    Args:
+        delta (int): The amount to change the volume by (positive to increase, negative to decrease).
+        
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    new_volume = change_volume(delta)
+    if new_volume is None:
+        return False
+    print(f"Volume set to {new_volume}%")
+    return True
+
+# Flips the mute state and returns the new state in one evaluation, so a toggle
+# needs a single call and can't interleave with a concurrent toggle
+TOGGLE_MUTE_SCRIPT = """set wasMuted to output muted of (get volume settings)
+set volume output muted (not wasMuted)
+return not wasMuted"""
+
+def toggle_mute():
+    """
+    Toggles mute/unmute for the audio output.
+    
+    The state is read and flipped with a single AppleScript evaluation. If that
+    is not supported, the current mute state is determined first and then toggled.
+    
+    Returns:
+        bool: The new mute state (True for muted, False for unmuted), or None if unsuccessful.
+    """
+    if not device_supports("mute_supported"):
+        print_mute_unavailable()
+        return None
+    
+    try:
+        # Preferred: read and flip the state inside a single AppleScript evaluation
+        new_state = run_applescript_variants("toggle_mute", [
+            # Standard command
+            ("standard", TOGGLE_MUTE_SCRIPT),
+            # Alternative with System Events
+            ("system_events", in_system_events(TOGGLE_MUTE_SCRIPT))
+        ], parse=parse_applescript_bool)
+        
+        if new_state is not None:
+            record_capabilities(mute_supported=True)
+            print(f"Audio {'muted' if new_state else 'unmuted'}")
+            return new_state
+        
+        # Fallback: read and write the state with separate calls
+        audio_state = get_audio_state()
+        is_muted = audio_state.output_muted if audio_state is not None else None
+        
+        if is_muted is None:
+            print_mute_unavailable()
+            return None
+        
+        # Toggle mute state
+        state = 'false' if is_muted else 'true'
+        
+        # Try different AppleScript commands to set the mute state
+        result = run_applescript_variants("set_mute", [
+            # Standard command
+            ("standard", f'set volume output muted {state}'),
+            # Alternative with System Events
+            ("system_events", f'tell application "System Events" to set volume output muted {state}')
+        ])
+        
+        if result is not None:
+            print(f"Audio {'unmuted' if is_muted else 'muted'}")
+            return not is_muted
+        
+        record_capabilities(mute_supported=False)
+        print("Mute state could not be toggled.", file=sys.stderr)
+        print("Additional permissions may be required.", file=sys.stderr)
+        print("The device switching functionality is not affected and continues to work.", file=sys.stderr)
+        return None
+    except Exception as e:
+        print(f"Error toggling mute state: {e}", file=sys.stderr)
+        print("The device switching functionality is not affected and continues to work.", file=sys.stderr)
+        return None
+
+def reset_request_state():
+    """Forgets state that is only valid for a single command, e.g. the current device."""
+    global _capability_device, device_cache_ttl
+    _capability_device = None
+    device_cache_ttl = DEFAULT_DEVICE_CACHE_TTL
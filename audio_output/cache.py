@@ -0,0 +1,100 @@
+"""Per-user cache files shared by all processes of the tool."""
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+
+# Directory for per-user cache files
+CACHE_DIR = os.environ.get("SELECT_AUDIO_OUTPUT_CACHE_DIR") or os.path.expanduser(
+    "~/Library/Caches/select_audio_output"
+)
+
+def load_cache(name):
+    """
+    Loads a JSON cache file from the per-user cache directory.
+    
+    Args:
+        name (str): The file name of the cache.
+        
+    Returns:
+        The decoded content, or None if the file is missing or unreadable.
+    """
+    try:
+        with open(os.path.join(CACHE_DIR, name), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_cache(name, data):
+    """
+    Atomically writes a JSON cache file to the per-user cache directory.
+    
+    The data is written to a temporary file first and then renamed, so
+    concurrent readers never see a partially written file. Errors are ignored
+    because the caches are only an optimization.
+    
+    Args:
+        name (str): The file name of the cache.
+        data: The JSON-serializable content.
+    """
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", dir=CACHE_DIR)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(CACHE_DIR, name))
+    except OSError:
+        pass
+
+
+def remove_cache(name):
+    """
+    Removes a cache file, e.g. after it turned out to be stale.
+    
+    Args:
+        name (str): File name inside CACHE_DIR.
+    """
+    try:
+        os.remove(os.path.join(CACHE_DIR, name))
+    except FileNotFoundError:
+        pass
+
+@contextlib.contextmanager
+def locked_cache(name):
+    """
+    Locks a JSON cache file that several processes update, and yields its content.
+    
+    An exclusive lock on a separate lock file is held for the duration of the
+    block. Changes made to the yielded dict are saved when the block ends;
+    blocks that only read the content don't rewrite the file.
+    
+    Args:
+        name (str): The file name of the cache.
+        
+    Raises:
+        OSError: If the lock file cannot be created, e.g. because the cache
+            directory is not writable. Callers then run without coordination.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(os.path.join(CACHE_DIR, name + ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        data = load_cache(name)
+        if not isinstance(data, dict):
+            data = {}
+        snapshot = json.dumps(data)
+        yield data
+        if json.dumps(data) != snapshot:
+            save_cache(name, data)
+
+def process_alive(pid):
+    """Checks whether a process with the given pid exists."""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -0,0 +1,51 @@
+"""Running commands on behalf of long-running modes with captured output."""
+import collections
+import contextlib
+import io
+import sys
+import threading
+import traceback
+
+from .backend import reset_request_state
+from .coordination import command_turn
+
+# Serializes backend calls of long-running modes, whose output is captured
+# by redirecting the process-wide sys.stdout and sys.stderr
+_backend_lock = threading.RLock()
+
+# Result of call_captured(): the return value, the captured output and the exit code
+CapturedCall = collections.namedtuple("CapturedCall", ["result", "stdout", "stderr", "code"])
+
+def call_captured(func, *args, turn=False):
+    """
+    Calls a function of this module on behalf of a long-running mode.
+    
+    Messages the function prints are captured instead of written to the
+    terminal, and sys.exit() calls are turned into an exit code.
+    Commands that change the audio settings pass turn=True, so they are
+    ordered with those of other processes like CLI invocations are.
+    
+    Args:
+        func (callable): The function to call, e.g. main or switch_device.
+        *args: Arguments for the function.
+        turn (bool): Wait for this process's turn in the command queue first.
+        
+    Returns:
+        CapturedCall: The result, captured stdout and stderr, and the exit code.
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    result, code = None, 0
+    with _backend_lock:
+        reset_request_state()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                with command_turn() if turn else contextlib.nullcontext():
+                    result = func(*args)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                if not isinstance(e.code, (int, type(None))):
+                    print(e.code, file=sys.stderr)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+    return CapturedCall(result, stdout.getvalue(), stderr.getvalue(), code)
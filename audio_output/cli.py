@@ -0,0 +1,319 @@
+"""Command-line interface."""
+import argparse
+import sys
+
+from . import backend, daemon
+from .applescript import reset_variant_order
+from .backend import (
+    AudioState, device_supports, get_audio_state, get_current_device, get_volume,
+    list_devices, reset_capabilities, set_volume, toggle_mute
+)
+from .config import load_config
+from .coordination import adjust_volume_coalesced, command_turn, single_flight, volume_adjustment_statistics
+from .daemon import forward_to_daemon, run_daemon
+from .devices import switch_device, switch_to_preferred
+from .fifo import DEFAULT_FIFO, run_fifo_listener
+from .interactive import interactive_mode
+from .matching import device_index
+from .zygote import run_in_zygote, run_zygote
+
+# Options that start a long-running mode or bypass the daemon and zygote,
+# and therefore always run in this process
+LOCAL_ONLY_OPTIONS = ("--daemon", "--zygote", "--http", "--osc", "--fifo", "--metrics", "--no-daemon")
+
+def is_read_only(args):
+    """
+    Checks whether a command line only queries the audio settings.
+    
+    Follows the order in which main() handles the options.
+    
+    Args:
+        args (argparse.Namespace): The parsed command line.
+        
+    Returns:
+        bool: True if running the command twice does no harm.
+    """
+    if args.volume_stats:
+        return True
+    if args.reset_variants:
+        return False
+    if args.get_volume:
+        return True
+    if (args.volume is not None or args.volume_up is not None or args.volume_down is not None
+            or args.toggle_mute):
+        return False
+    if args.current:
+        return True
+    if args.interactive or args.preferred:
+        return False
+    return args.complete is not None or args.device is None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Select a macOS audio output device by name and control volume settings."
+    )
+    parser.add_argument(
+        "-i", "--interactive",
+        action="store_true",
+        help="Interactive mode: Selection using arrow keys"
+    )
+    parser.add_argument(
+        "-c", "--current",
+        action="store_true",
+        help="Shows the current audio output device"
+    )
+    parser.add_argument(
+        "-m", "--toggle-mute",
+        action="store_true",
+        help="Toggles mute/unmute"
+    )
+    parser.add_argument(
+        "-p", "--preferred",
+        action="store_true",
+        help="Switches to the first available device of the preferred list in the configuration file"
+    )
+    parser.add_argument(
+        "-g", "--get-volume",
+        action="store_true",
+        help="Shows the current volume level"
+    )
+    parser.add_argument(
+        "-v", "--volume",
+        type=int,
+        metavar="LEVEL",
+        help="Sets the volume to a specific level (0-100)"
+    )
+    parser.add_argument(
+        "-u", "--volume-up",
+        type=int,
+        metavar="AMOUNT",
+        help="Increases the volume by a specific amount"
+    )
+    parser.add_argument(
+        "-d", "--volume-down",
+        type=int,
+        metavar="AMOUNT",
+        help="Decreases the volume by a specific amount"
+    )
+    parser.add_argument(
+        "--complete",
+        metavar="PREFIX",
+        help="Lists the devices and aliases that start with PREFIX, e.g. for shell completion"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignores the cached device list and queries the devices again"
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        metavar="SECONDS",
+        help="How long the device list is cached (default: 300, 0 disables the cache)"
+    )
+    parser.add_argument(
+        "--volume-stats",
+        action="store_true",
+        help="Shows how many volume writes were saved by merging rapid adjustments"
+    )
+    parser.add_argument(
+        "--reset-variants",
+        action="store_true",
+        help="Forgets which AppleScript variants and volume features work on this system"
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Runs a background daemon that executes later commands without startup delay"
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Executes the command in this process even if a daemon is running"
+    )
+    parser.add_argument(
+        "--http",
+        type=int,
+        metavar="PORT",
+        help="Runs an HTTP control API on localhost on the given port"
+    )
+    parser.add_argument(
+        "--osc",
+        metavar="[HOST:]PORT",
+        help="Receives OSC messages (/volume, /mute, /device) over UDP, by default on localhost"
+    )
+    parser.add_argument(
+        "--fifo",
+        nargs="?",
+        const=DEFAULT_FIFO,
+        metavar="PATH",
+        help=f"Executes commands written to a named pipe (default: {DEFAULT_FIFO})"
+    )
+    parser.add_argument(
+        "--metrics",
+        type=int,
+        metavar="PORT",
+        help="Serves Prometheus metrics on localhost while --daemon, --http, --osc or --fifo runs"
+    )
+    parser.add_argument(
+        "--zygote",
+        action="store_true",
+        help="Runs a background server with all modules preloaded that starts later commands faster"
+    )
+    parser.add_argument(
+        "device",
+        nargs="?",
+        help="Name of the audio output device. If omitted, lists available devices."
+    )
+    if argv is None:
+        argv = sys.argv[1:]
+        # Let a running zygote execute the command. It behaves exactly like
+        # this process would, including the interactive mode on this terminal.
+        if not any(arg.split("=")[0] in LOCAL_ONLY_OPTIONS for arg in argv):
+            code = run_in_zygote(argv)
+            if code is not None:
+                sys.exit(code)
+    args = parser.parse_args(argv)
+
+    if args.metrics is not None:
+        # Commands run by a zygote execute in forked children whose metrics
+        # are lost, and a one-shot command exits before it can be scraped
+        if args.zygote or not (args.daemon or args.http is not None
+                               or args.osc is not None or args.fifo is not None):
+            print("Error: --metrics requires --daemon, --http, --osc or --fifo", file=sys.stderr)
+            sys.exit(1)
+        # The long-running modes are imported when they are started, so that
+        # commands forwarded to the daemon or zygote don't load http.server
+        from .http_api import start_metrics_server
+        try:
+            start_metrics_server(args.metrics)
+        except OSError as e:
+            print(f"Error starting the metrics server: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    if args.zygote:
+        run_zygote()
+        sys.exit(0)
+
+    if args.http is not None:
+        from .http_api import run_http_server
+        run_http_server(args.http)
+        sys.exit(0)
+
+    if args.osc is not None:
+        from .osc import run_osc_listener
+        run_osc_listener(args.osc)
+        sys.exit(0)
+
+    if args.fifo is not None:
+        run_fifo_listener(args.fifo)
+        sys.exit(0)
+
+    if args.daemon:
+        run_daemon()
+        sys.exit(0)
+
+    # Let a running daemon execute the command. Interactive mode needs this
+    # process's terminal and always runs here.
+    if not (daemon.in_daemon() or args.interactive or args.no_daemon):
+        try:
+            answer = forward_to_daemon(argv, read_only=is_read_only(args))
+        except (OSError, ValueError) as e:
+            print(f"Error communicating with the daemon: {e}", file=sys.stderr)
+            sys.exit(1)
+        if answer is not None:
+            sys.stdout.write(answer["stdout"])
+            sys.stderr.write(answer["stderr"])
+            sys.exit(answer["code"])
+
+    if args.cache_ttl is not None:
+        backend.device_cache_ttl = args.cache_ttl
+    if args.no_cache:
+        backend.device_cache_ttl = 0
+
+    if args.volume_stats:
+        print(volume_adjustment_statistics())
+        sys.exit(0)
+
+    if args.reset_variants:
+        reset_variant_order()
+        reset_capabilities()
+        print("Learned AppleScript variant order and device capabilities have been reset.")
+        sys.exit(0)
+
+    # Process volume options
+    if args.get_volume:
+        state = single_flight(
+            "audio_state",
+            lambda: get_audio_state() if device_supports("volume_readable") else None,
+            decode=lambda values: AudioState(*values)
+        )
+        volume = get_volume(state or AudioState(None, None, None, None))
+        if volume is not None:
+            print(f"Current volume: {volume}%")
+        sys.exit(0)
+        
+    if args.volume is not None:
+        with command_turn():
+            success = set_volume(args.volume)
+        if not success:
+            sys.exit(1)
+        sys.exit(0)
+        
+    if args.volume_up is not None:
+        success = adjust_volume_coalesced(args.volume_up)
+        if not success:
+            sys.exit(1)
+        sys.exit(0)
+        
+    if args.volume_down is not None:
+        success = adjust_volume_coalesced(-args.volume_down)
+        if not success:
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.toggle_mute:
+        with command_turn():
+            result = toggle_mute()
+        if result is None:
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.current:
+        current = single_flight("current", get_current_device)
+        if current:
+            print(f"{current}")
+        else:
+            print("Error determining the current device", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.interactive:
+        interactive_mode()
+        sys.exit(0)
+
+    if args.preferred:
+        with command_turn():
+            switch_to_preferred()
+        sys.exit(0)
+
+    if args.complete is not None:
+        devices = single_flight("devices", list_devices)
+        for device in device_index(devices).completions(args.complete):
+            print(device)
+        prefix = args.complete.casefold()
+        for alias in sorted(load_config().aliases):
+            if alias.startswith(prefix):
+                print(alias)
+        sys.exit(0)
+
+    if args.device is None:
+        current = single_flight("current", get_current_device)
+        print("Available output devices:")  # This was already in English
+        for dev in single_flight("devices", list_devices):
+            marker = " (active)" if dev == current else ""
+            print(f"  • {dev}{marker}")
+        sys.exit(0)
+
+    with command_turn():
+        switch_device(args.device)
@@ -0,0 +1,322 @@
+"""
+The TOML configuration file with aliases, default volumes, preferred devices
+and matching settings.
+"""
+import collections
+import contextlib
+import os
+import select
+import sys
+import threading
+import time
+
+from .cache import load_cache, save_cache
+from .capture import _backend_lock
+from .matching import DELETION_MAX_DISTANCE
+
+# Configuration file with aliases, default volumes, preferred devices and matching settings
+CONFIG_FILE = os.environ.get(
+    "SELECT_AUDIO_OUTPUT_CONFIG",
+    os.path.join(os.path.expanduser("~"), ".config", "select_audio_output", "config.toml")
+)
+
+# File that stores the compiled configuration, so that startups skip parsing TOML
+CONFIG_CACHE = "config.json"
+
+# Format of the compiled configuration in CONFIG_CACHE; increase it when
+# compile_config changes, so that older caches are compiled again
+CONFIG_CACHE_VERSION = 2
+
+# Settings of find_closest_device that can be changed in the [matching] table
+DEFAULT_MATCHING = {
+    # Method of the fuzzy matching stage, one of MATCHING_STRATEGIES
+    "strategy": "difflib",
+    # Minimum difflib similarity of the fuzzy matching stage
+    "cutoff": 0.3,
+    # Maximum number of edits for the edit distance strategies
+    "max_distance": 2,
+    # Whether the difflib strategy may use NumPy for large device lists
+    "vectorize": True,
+}
+
+# Methods of the fuzzy matching stage:
+#   difflib  - best difflib similarity ratio above the cutoff
+#   bktree   - fewest edits (Levenshtein distance) in a BK-tree, up to max_distance
+#   symspell - fewest edits to a device name or one of its words, found in a
+#              deletion dictionary, up to max_distance (at most 2)
+MATCHING_STRATEGIES = ("difflib", "bktree", "symspell")
+
+# Compiled configuration:
+#   aliases   - casefolded alias -> device name
+#   volumes   - device name -> volume that is set after switching to it
+#   preferred - device names in the order used by --preferred
+#   matching  - settings of find_closest_device, see DEFAULT_MATCHING
+Config = collections.namedtuple("Config", ["aliases", "volumes", "preferred", "matching"])
+
+# Configuration used when there is no configuration file
+DEFAULT_CONFIG = Config({}, {}, [], dict(DEFAULT_MATCHING))
+
+# Configuration of this process, loaded lazily
+_config = None
+
+def parse_config_file(path):
+    """
+    Parses the TOML configuration file.
+    
+    Args:
+        path (str): Path of the configuration file.
+        
+    Returns:
+        dict: The parsed TOML document.
+        
+    Raises:
+        ValueError: If the file is not valid TOML or no TOML parser is available.
+    """
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ValueError("reading it requires Python 3.11 or the tomli package (pip3 install tomli)")
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+def compile_config(data):
+    """
+    Validates a parsed configuration file and prepares it for fast lookups.
+    
+    Aliases are casefolded, and device names in [volumes] and preferred may
+    themselves be aliases.
+    
+    Args:
+        data (dict): The parsed TOML document.
+        
+    Returns:
+        Config: The compiled configuration.
+        
+    Raises:
+        ValueError: If a setting is unknown or has an invalid value.
+    """
+    unknown = set(data) - {"aliases", "volumes", "preferred", "matching"}
+    if unknown:
+        raise ValueError(f"unknown setting '{sorted(unknown)[0]}'")
+    for table in ("aliases", "volumes", "matching"):
+        if not isinstance(data.get(table, {}), dict):
+            raise ValueError(f"{table} must be a table, e.g. [{table}]")
+
+    aliases = {}
+    for alias, device in data.get("aliases", {}).items():
+        if not isinstance(device, str):
+            raise ValueError(f"alias '{alias}' must be a device name")
+        aliases[alias.casefold()] = device
+
+    def resolve(name):
+        return aliases.get(name.casefold(), name)
+
+    volumes = {}
+    for device, level in data.get("volumes", {}).items():
+        if not isinstance(level, int) or isinstance(level, bool) or not 0 <= level <= 100:
+            raise ValueError(f"volume of '{device}' must be an integer between 0 and 100")
+        volumes[resolve(device)] = level
+
+    preferred = data.get("preferred", [])
+    if not isinstance(preferred, list) or not all(isinstance(name, str) for name in preferred):
+        raise ValueError("preferred must be a list of device names")
+
+    matching = dict(DEFAULT_MATCHING)
+    for key, value in data.get("matching", {}).items():
+        if key not in DEFAULT_MATCHING:
+            raise ValueError(f"unknown setting 'matching.{key}'")
+        matching[key] = value
+    cutoff = matching["cutoff"]
+    if not isinstance(cutoff, (int, float)) or isinstance(cutoff, bool) or not 0 <= cutoff <= 1:
+        raise ValueError("matching.cutoff must be a number between 0 and 1")
+    matching["cutoff"] = float(cutoff)
+    if not isinstance(matching["vectorize"], bool):
+        raise ValueError("matching.vectorize must be true or false")
+    if matching["strategy"] not in MATCHING_STRATEGIES:
+        raise ValueError(f"matching.strategy must be one of: {', '.join(MATCHING_STRATEGIES)}")
+    max_distance = matching["max_distance"]
+    if not isinstance(max_distance, int) or isinstance(max_distance, bool) or max_distance < 0:
+        raise ValueError("matching.max_distance must be a non-negative integer")
+    if matching["strategy"] == "symspell" and max_distance > DELETION_MAX_DISTANCE:
+        raise ValueError(f"matching.max_distance must be at most {DELETION_MAX_DISTANCE} for the symspell strategy")
+
+    return Config(aliases, volumes, [resolve(name) for name in preferred], matching)
+
+def read_config():
+    """
+    Reads the configuration file.
+    
+    The compiled configuration is cached together with the modification time
+    and size of the file and CONFIG_CACHE_VERSION, so that the TOML file is
+    only parsed after it changed.
+    
+    Returns:
+        Config: The configuration, or DEFAULT_CONFIG if there is no file.
+        
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is invalid.
+    """
+    try:
+        info = os.stat(CONFIG_FILE)
+    except FileNotFoundError:
+        return DEFAULT_CONFIG
+
+    key = [CONFIG_CACHE_VERSION, CONFIG_FILE, info.st_mtime_ns, info.st_size]
+    cache = load_cache(CONFIG_CACHE)
+    if isinstance(cache, dict) and cache.get("key") == key:
+        try:
+            config = Config(**cache["config"])
+            return config._replace(matching={**DEFAULT_MATCHING, **config.matching})
+        except (TypeError, KeyError):
+            pass
+
+    config = compile_config(parse_config_file(CONFIG_FILE))
+    save_cache(CONFIG_CACHE, {"key": key, "config": config._asdict()})
+    return config
+
+def load_config():
+    """
+    Returns the configuration, reading the configuration file on first use.
+    
+    Returns:
+        Config: The configuration of this process.
+    """
+    global _config
+    if _config is None:
+        try:
+            _config = read_config()
+        except (OSError, ValueError) as e:
+            print(f"Error in configuration file {CONFIG_FILE}: {e}", file=sys.stderr)
+            sys.exit(1)
+    return _config
+
+def reload_config(log=None):
+    """
+    Reads the configuration file again and replaces the configuration of this
+    process if it changed.
+    
+    The new configuration is compiled before the backend lock is taken, so
+    commands in progress finish with the configuration they started with.
+    Sections that did not change keep their previous objects. An invalid
+    file is reported and the previous configuration stays in use.
+    
+    Args:
+        log (file): Where to report the reload, by default sys.stderr.
+        
+    Returns:
+        list: The names of the sections that changed.
+    """
+    global _config
+    log = log or sys.stderr
+    try:
+        config = read_config()
+    except (OSError, ValueError) as e:
+        print(f"Error in configuration file {CONFIG_FILE}, keeping the previous configuration: {e}", file=log)
+        return []
+    previous = _config or DEFAULT_CONFIG
+    changed = [field for field in Config._fields if getattr(config, field) != getattr(previous, field)]
+    if not changed:
+        return []
+    config = config._replace(**{
+        field: getattr(previous, field) for field in Config._fields if field not in changed
+    })
+    with _backend_lock:
+        _config = config
+    print(f"Configuration reloaded ({', '.join(changed)} changed)", file=log)
+    return changed
+
+# Seconds between checks of the configuration file when it cannot be watched
+CONFIG_POLL_INTERVAL = 2.0
+
+# Seconds to wait after a change before reading the file, so that an editor
+# can finish writing it
+CONFIG_SETTLE_DELAY = 0.1
+
+def config_file_signature():
+    """Returns the inode, modification time and size of the configuration file."""
+    try:
+        info = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return (info.st_ino, info.st_mtime_ns, info.st_size)
+
+def wait_for_config_change(timeout):
+    """
+    Waits until the configuration file or its directory is modified.
+    
+    Uses kqueue on macOS. The directory is watched as well because editors
+    usually save by replacing the file. Where kqueue is not available, or
+    the file does not exist yet, this simply waits for the timeout.
+    
+    Args:
+        timeout (float): Maximum number of seconds to wait.
+    """
+    if not hasattr(select, "kqueue"):
+        time.sleep(timeout)
+        return
+    descriptors = []
+    for path in (os.path.dirname(CONFIG_FILE), CONFIG_FILE):
+        with contextlib.suppress(OSError):
+            descriptors.append(os.open(path, getattr(os, "O_EVTONLY", os.O_RDONLY)))
+    kqueue = select.kqueue()
+    try:
+        changes = [
+            select.kevent(
+                descriptor,
+                filter=select.KQ_FILTER_VNODE,
+                flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+                fflags=(select.KQ_NOTE_WRITE | select.KQ_NOTE_EXTEND | select.KQ_NOTE_ATTRIB
+                        | select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME)
+            )
+            for descriptor in descriptors
+        ]
+        kqueue.control(changes, 1, timeout)
+    finally:
+        kqueue.close()
+        for descriptor in descriptors:
+            os.close(descriptor)
+
+def watch_config(log=None):
+    """
+    Reloads the configuration in a background thread whenever the file changes.
+    
+    Used by the long-running modes, so that aliases and other settings can be
+    edited without a restart.
+    
+    Args:
+        log (file): Where to report reloads, by default the current sys.stderr.
+        
+    Returns:
+        threading.Event: Set it to stop watching.
+    """
+    log = log or sys.stderr
+    stopped = threading.Event()
+
+    def watch():
+        signature = config_file_signature()
+        while not stopped.is_set():
+            wait_for_config_change(CONFIG_POLL_INTERVAL)
+            if config_file_signature() == signature:
+                continue
+            time.sleep(CONFIG_SETTLE_DELAY)
+            signature = config_file_signature()
+            reload_config(log)
+
+    threading.Thread(target=watch, daemon=True).start()
+    return stopped
+
+def resolve_alias(name):
+    """
+    Replaces a configured alias with its device name.
+    
+    Args:
+        name (str): A device name or alias.
+        
+    Returns:
+        str: The device name the alias stands for, or the name itself.
+    """
+    return load_config().aliases.get(name.casefold(), name)
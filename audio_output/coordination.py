@@ -0,0 +1,221 @@
+"""Coordination of commands that run at the same time in different processes."""
+import contextlib
+import os
+import sys
+import time
+
+from .backend import adjust_volume, change_volume
+from .cache import load_cache, locked_cache, process_alive
+
+# Shared state of concurrent volume adjustments
+COALESCE_STATE = "volume_adjustments.json"
+
+# Seconds between checks while waiting for another process to apply a change
+COALESCE_POLL_INTERVAL = 0.01
+
+@contextlib.contextmanager
+def coalesce_state():
+    """
+    Locks and yields the shared state of concurrent volume adjustments.
+    
+    The state is a dict with the net "pending" delta, ticket numbers of queued
+    ("next_ticket") and applied ("applied_ticket") adjustments, the pid of the
+    process currently writing ("writer"), the last resulting "volume" and the
+    "adjustments" and "writes" counters. Changes are saved when the block ends.
+    """
+    with locked_cache(COALESCE_STATE) as state:
+        for key in ("pending", "next_ticket", "applied_ticket", "adjustments", "writes"):
+            state.setdefault(key, 0)
+        state.setdefault("writer", None)
+        state.setdefault("volume", None)
+        yield state
+
+def adjust_volume_coalesced(delta):
+    """
+    Increases or decreases the volume, merging concurrent adjustments.
+    
+    Holding a volume hotkey starts many processes per second. Each one adds
+    its delta to a shared pending sum. Only one process at a time writes to
+    the backend: it applies the whole pending sum with a single change and
+    repeats until nothing is pending. The other processes wait until their
+    delta has been applied and then report the resulting volume. If the
+    shared state cannot be locked, the delta is applied directly.
+    
+    Args:
+        delta (int): The amount to change the volume by (positive to increase, negative to decrease).
+        
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    try:
+        with coalesce_state() as state:
+            state["pending"] += int(delta)
+            state["next_ticket"] += 1
+            state["adjustments"] += 1
+            ticket = state["next_ticket"]
+            writing = not process_alive(state["writer"])
+            if writing:
+                state["writer"] = os.getpid()
+    except OSError:
+        return adjust_volume(delta)
+
+    while True:
+        if writing:
+            # Apply everything that is pending with a single write
+            with coalesce_state() as state:
+                pending, last_ticket = state["pending"], state["next_ticket"]
+                state["pending"] = 0
+            try:
+                with command_turn():
+                    new_volume = change_volume(pending)
+            except BaseException:
+                # Hand the delta back and step down, so waiting processes (or
+                # threads of the daemon) take over instead of waiting forever
+                with coalesce_state() as state:
+                    state["pending"] += pending
+                    state["writer"] = None
+                raise
+            with coalesce_state() as state:
+                state["applied_ticket"] = last_ticket
+                state["volume"] = new_volume
+                state["writes"] += 1
+                if state["next_ticket"] == last_ticket:
+                    state["writer"] = None
+                    break
+        else:
+            time.sleep(COALESCE_POLL_INTERVAL)
+            with coalesce_state() as state:
+                if state["applied_ticket"] >= ticket:
+                    new_volume = state["volume"]
+                    break
+                # Take over if the writing process died before applying our delta
+                if not process_alive(state["writer"]):
+                    state["writer"] = os.getpid()
+                    writing = True
+
+    if new_volume is None:
+        if not writing:
+            print("Volume could not be adjusted.", file=sys.stderr)
+            print("The device switching functionality is not affected and continues to work.", file=sys.stderr)
+        return False
+    print(f"Volume set to {new_volume}%")
+    return True
+
+def volume_adjustment_statistics():
+    """
+    Reports how many backend writes were saved by merging volume adjustments.
+    
+    Returns:
+        str: The number of adjustments, backend writes and saved writes.
+    """
+    state = load_cache(COALESCE_STATE)
+    if not isinstance(state, dict):
+        state = {}
+    adjustments, writes = state.get("adjustments", 0), state.get("writes", 0)
+    return (f"{adjustments} volume adjustments, {writes} backend writes, "
+            f"{max(0, adjustments - writes)} writes saved")
+
+# Shared state of the queue that orders mutating commands across processes
+COMMAND_QUEUE = "command_queue.json"
+
+# Shared state of read-only backend calls that are currently in flight
+SINGLE_FLIGHT = "single_flight.json"
+
+# Seconds between checks while waiting for another process
+QUEUE_POLL_INTERVAL = 0.01
+
+@contextlib.contextmanager
+def command_turn():
+    """
+    Waits until it is this process's turn to change the audio settings.
+    
+    Mutating commands of concurrent invocations (e.g. a hotkey storm, or a cron
+    job and a manual press) take a ticket from a per-user queue and run one at
+    a time in the order they arrived. Tickets of processes that died are skipped.
+    If the queue cannot be locked, the command runs right away.
+    """
+    try:
+        with locked_cache(COMMAND_QUEUE) as queue_state:
+            ticket = queue_state.get("next", 0)
+            queue_state["next"] = ticket + 1
+            queue_state.setdefault("serving", ticket)
+            queue_state.setdefault("holders", {})[str(ticket)] = os.getpid()
+    except OSError:
+        ticket = None
+    if ticket is None:
+        yield
+        return
+
+    try:
+        while True:
+            with locked_cache(COMMAND_QUEUE) as queue_state:
+                holders = queue_state["holders"]
+                while queue_state["serving"] < ticket \
+                        and not process_alive(holders.get(str(queue_state["serving"]))):
+                    holders.pop(str(queue_state["serving"]), None)
+                    queue_state["serving"] += 1
+                if queue_state["serving"] >= ticket:
+                    break
+            time.sleep(QUEUE_POLL_INTERVAL)
+        yield
+    finally:
+        with locked_cache(COMMAND_QUEUE) as queue_state:
+            queue_state["holders"].pop(str(ticket), None)
+            if queue_state["serving"] == ticket:
+                queue_state["serving"] = ticket + 1
+
+def single_flight(key, func, decode=None):
+    """
+    Shares the result of a read-only backend call between concurrent processes.
+    
+    If another process is already running the same call, this waits for its
+    result instead of spawning the backend again. Results are only shared
+    while the call is in flight; later calls query the backend again. If the
+    shared state cannot be locked, the call runs without sharing.
+    
+    Args:
+        key (str): Identifies the call, e.g. "current".
+        func (callable): Performs the call. Its result must be JSON-serializable
+            (namedtuples are stored as lists).
+        decode (callable): Converts a result received from another process back.
+        
+    Returns:
+        The result of the call.
+    """
+    try:
+        with locked_cache(SINGLE_FLIGHT) as flights:
+            flight = flights.get(key)
+            leading = not (flight and flight["finished"] is None and process_alive(flight["leader"]))
+            if leading:
+                flight = flights[key] = {
+                    "leader": os.getpid(), "started": time.time(), "finished": None, "result": None
+                }
+    except OSError:
+        return func()
+
+    if leading:
+        try:
+            result = func()
+        except BaseException:
+            # Let waiting processes run the call themselves, e.g. to report the error
+            with locked_cache(SINGLE_FLIGHT) as flights:
+                if flights.get(key, {}).get("started") == flight["started"]:
+                    del flights[key]
+            raise
+        with locked_cache(SINGLE_FLIGHT) as flights:
+            if flights.get(key, {}).get("started") == flight["started"]:
+                flights[key].update(finished=time.time(), result=result)
+        return result
+
+    while True:
+        time.sleep(QUEUE_POLL_INTERVAL)
+        with locked_cache(SINGLE_FLIGHT) as flights:
+            current = flights.get(key)
+            joined = current is not None and current["started"] == flight["started"]
+            if joined and current["finished"] is not None:
+                result = current["result"]
+                return decode(result) if decode and result is not None else result
+            if joined and process_alive(current["leader"]):
+                continue
+        # The other process died or its result was replaced, so run the call here
+        return single_flight(key, func, decode)
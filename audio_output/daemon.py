@@ -0,0 +1,172 @@
+"""Background daemon that executes forwarded command lines without startup delay."""
+import contextlib
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+
+from .cache import CACHE_DIR
+from .capture import call_captured
+from .config import watch_config
+from .zygote import settings_environment
+
+# Unix domain socket the background daemon listens on
+DAEMON_SOCKET = os.environ.get("SELECT_AUDIO_OUTPUT_SOCKET") or os.path.join(CACHE_DIR, "daemon.sock")
+
+# Seconds the client waits for the daemon to answer a request
+DAEMON_TIMEOUT = 30.0
+
+# Seconds the client waits to connect and for the daemon to pick up the
+# request. A daemon that is busy or stuck is bypassed after this time.
+DAEMON_CONNECT_TIMEOUT = 1.0
+
+# Seconds the client waits for the answer to a read-only command before it
+# runs the command itself
+DAEMON_READ_ONLY_TIMEOUT = 5.0
+
+# True while running inside the daemon, so requests are not forwarded again
+_in_daemon = False
+
+def in_daemon():
+    """Returns True while running inside the daemon."""
+    return _in_daemon
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Runs one forwarded command line inside the daemon.
+    
+    The daemon first sends {"ready": true}, and only then does the client
+    send its request, so a client that gave up waiting never has its command
+    run later. The request is a JSON object with an "argv" list and the
+    client's settings_environment() as "env". The answer is a JSON object
+    with the captured "stdout", "stderr" and the exit "code", or with a
+    "refused" reason if the environment differs from the daemon's.
+    """
+
+    def handle(self):
+        try:
+            self.wfile.write(b'{"ready": true}\n')
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+            argv = request["argv"]
+            env = request["env"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+
+        if settings_environment(env) != settings_environment(os.environ):
+            answer = {"refused": "the environment differs from the daemon's"}
+            self.wfile.write(json.dumps(answer).encode("utf-8") + b"\n")
+            return
+
+        from .cli import main
+        call = call_captured(main, argv)
+        answer = {"stdout": call.stdout, "stderr": call.stderr, "code": call.code}
+        self.wfile.write(json.dumps(answer).encode("utf-8") + b"\n")
+
+def run_daemon():
+    """
+    Runs the background daemon until it is interrupted.
+    
+    The daemon keeps the osascript coprocess, the learned AppleScript variants,
+    the device capabilities and the interpreter itself warm, and executes the
+    command lines that clients forward over DAEMON_SOCKET. Requests are handled
+    one after another.
+    """
+    global _in_daemon
+    _in_daemon = True
+
+    # Refuse to start twice, but replace a socket left behind by a crashed daemon
+    client = connect_to_daemon()
+    if client is not None:
+        client.close()
+        print(f"A daemon is already running on {DAEMON_SOCKET}", file=sys.stderr)
+        sys.exit(1)
+    os.makedirs(os.path.dirname(DAEMON_SOCKET), exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(DAEMON_SOCKET)
+
+    old_umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(DAEMON_SOCKET, DaemonRequestHandler)
+    finally:
+        os.umask(old_umask)
+
+    # Clean up the socket when stopped with kill or launchctl
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    watch_config()
+    print(f"Daemon listening on {DAEMON_SOCKET}")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(DAEMON_SOCKET)
+
+def connect_to_daemon(timeout=DAEMON_CONNECT_TIMEOUT):
+    """
+    Connects to the running daemon.
+    
+    Args:
+        timeout (float): Seconds to wait for the connection.
+        
+    Returns:
+        socket.socket: The connected socket, or None if no daemon is running.
+    """
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    except (AttributeError, OSError):
+        return None
+    try:
+        client.settimeout(timeout)
+        client.connect(DAEMON_SOCKET)
+    except OSError:
+        client.close()
+        return None
+    return client
+
+def forward_to_daemon(argv, read_only=False):
+    """
+    Executes a command line in the running daemon.
+    
+    The command is only sent once the daemon is ready to run it. If it does
+    not get ready within DAEMON_CONNECT_TIMEOUT, or its settings in the
+    environment differ from this process's, the command is not forwarded.
+    Other environment variables, such as PATH, are the daemon's own.
+    
+    Args:
+        argv (list): The command line arguments without the program name.
+        read_only (bool): Whether the command only queries the audio settings.
+            Such a command is run here if the daemon does not answer within
+            DAEMON_READ_ONLY_TIMEOUT.
+        
+    Returns:
+        dict: The "stdout", "stderr" and exit "code" of the command, or None
+            if it should be executed in this process.
+            
+    Raises:
+        OSError: If the daemon did not answer a command that changes settings
+            within DAEMON_TIMEOUT.
+        ValueError: If the answer is invalid.
+    """
+    client = connect_to_daemon()
+    if client is None:
+        return None
+    with client, client.makefile("rb") as answer:
+        try:
+            if not json.loads(answer.readline().decode("utf-8") or "{}").get("ready"):
+                return None
+        except (OSError, ValueError):
+            return None
+        client.settimeout(DAEMON_READ_ONLY_TIMEOUT if read_only else DAEMON_TIMEOUT)
+        client.sendall(json.dumps({"argv": argv, "env": settings_environment(os.environ)}).encode("utf-8") + b"\n")
+        try:
+            result = json.loads(answer.readline().decode("utf-8"))
+        except socket.timeout:
+            if read_only:
+                return None
+            raise
+        return None if "refused" in result else result
@@ -0,0 +1,317 @@
+"""Resolving device names and switching the audio output device."""
+import hashlib
+import json
+import subprocess
+import sys
+
+from . import config
+from .backend import invalidate_device_cache, list_devices, load_cached_devices, set_volume
+from .cache import load_cache, save_cache
+from .config import load_config, resolve_alias
+from .matching import device_index
+from .metrics import metrics
+
+metrics.describe("select_audio_output_match_strategy_total", "counter",
+                 "Device name resolutions, by the find_closest_device stage that decided them.")
+
+def find_closest_device(name, devices):
+    """
+    Finds the most similar device name when no exact match is found.
+    
+    Uses multiple matching strategies:
+    1. Exact match (case-insensitive)
+    2. Prefix matching (checks if a device name or one of its words starts
+       with the name)
+    3. Substring matching (checks if the name is contained in a device name)
+    4. Fuzzy matching for typo tolerance, with difflib or the strategy set
+       in the [matching] table of the configuration file
+    
+    The candidates of each strategy are looked up in a DeviceIndex instead of
+    scanning every device.
+    
+    Args:
+        name (str): The device name to search for
+        devices (list): List of available devices
+        
+    Returns:
+        str: The most similar device, or None if no matching device was found
+    """
+    if not devices:
+        return None
+    index = device_index(devices)
+    
+    # Strategy 1: Case-insensitive exact match
+    name_lower = name.lower()
+    if name_lower in index.exact:
+        count_match_strategy("exact")
+        return index.exact[name_lower]
+    
+    # Strategy 2: Prefix matching, preferring devices whose full name starts
+    # with the name over devices with a later word that does
+    completions = index.completions(name, limit=1)
+    if completions:
+        count_match_strategy("prefix")
+        return completions[0]
+    
+    # Strategy 3: Substring matching (checks if the name is contained in a device name)
+    matching_devices = index.containing(name_lower)
+    
+    # If exactly one device was found by substring matching, use it
+    if len(matching_devices) == 1:
+        count_match_strategy("substring")
+        return matching_devices[0]
+    
+    # If multiple devices were found, use the shortest one (likely the most specific)
+    elif len(matching_devices) > 1:
+        count_match_strategy("substring")
+        return min(matching_devices, key=len)
+    
+    # Strategy 4: Fuzzy matching for typo tolerance, with difflib by default
+    matching = load_config().matching
+    if matching["strategy"] == "bktree":
+        match = index.nearest(name, matching["max_distance"])
+    elif matching["strategy"] == "symspell":
+        match = index.corrected(name, matching["max_distance"])
+    else:
+        # Low cutoff value (0.3 by default) for more tolerance with typos
+        match = index.closest(name, matching["cutoff"], matching["vectorize"])
+    count_match_strategy("fuzzy" if match else "none")
+    return match
+
+def count_match_strategy(strategy):
+    """Counts which stage of find_closest_device resolved a query."""
+    metrics.inc("select_audio_output_match_strategy_total", strategy=strategy)
+
+# File that remembers which device each query resolved to
+QUERY_CACHE = "queries.json"
+
+# Maximum number of remembered queries
+QUERY_CACHE_SIZE = 256
+
+# Remembered queries for the current device set, loaded lazily
+_query_cache = None
+
+# Version of find_closest_device's rules; increase it when a query may
+# resolve differently, so that remembered queries are resolved again
+MATCHING_ALGORITHM_VERSION = 2
+
+def device_fingerprint(devices):
+    """
+    Computes a fingerprint that changes whenever the set of devices, the
+    matching settings or MATCHING_ALGORITHM_VERSION change.
+    
+    Args:
+        devices (list): List of available devices
+        
+    Returns:
+        str: A hex digest of the sorted device names, matching settings and
+            algorithm version.
+    """
+    settings = json.dumps(load_config().matching, sort_keys=True)
+    parts = sorted(devices) + [settings, str(MATCHING_ALGORITHM_VERSION)]
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+def resolve_device_name(name, devices):
+    """
+    Resolves a device query with find_closest_device, remembering the result.
+    
+    Users tend to type the same short queries over and over, so resolved
+    queries are stored in a per-user cache file. The cache is keyed by the
+    fingerprint of the device set and is discarded when the devices change.
+    
+    Args:
+        name (str): The device name to search for
+        devices (list): List of available devices
+        
+    Returns:
+        str: The most similar device, or None if no matching device was found
+    """
+    global _query_cache
+    fingerprint = device_fingerprint(devices)
+    if _query_cache is None:
+        _query_cache = load_cache(QUERY_CACHE) or {}
+    if _query_cache.get("fingerprint") != fingerprint:
+        _query_cache = {"fingerprint": fingerprint, "queries": {}}
+
+    queries = _query_cache["queries"]
+    match = queries.get(name)
+    if match in devices:
+        metrics.inc("select_audio_output_cache_requests_total", cache="queries", result="hit")
+        return match
+    metrics.inc("select_audio_output_cache_requests_total", cache="queries", result="miss")
+
+    match = find_closest_device(name, devices)
+    if match is not None:
+        queries[name] = match
+        # Forget the oldest queries once the cache is full
+        for old_name in list(queries)[:-QUERY_CACHE_SIZE]:
+            del queries[old_name]
+        save_cache(QUERY_CACHE, _query_cache)
+    return match
+
+def try_switch_device(name):
+    """
+    Attempts to switch to a device with exactly the given name.
+    
+    Args:
+        name (str): The exact name of the audio output device.
+        
+    Returns:
+        bool: True if the device was switched, False otherwise.
+    """
+    try:
+        with metrics.timer("switch"):
+            result = subprocess.run(
+                ['SwitchAudioSource', '-t', 'output', '-s', name],
+                check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                text=True
+            )
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        return False
+    # Some SwitchAudioSource versions report unknown names with exit code 0
+    return "Could not find" not in result.stdout
+
+def finish_switch(device):
+    """
+    Reports a device switch and applies the configured volume of the device.
+    
+    Args:
+        device (str): The device that was switched to.
+    """
+    print(f"Switched audio output to: {device}")
+    level = load_config().volumes.get(device)
+    if level is not None:
+        set_volume(level)
+
+def is_partial_name(name, devices):
+    """
+    Checks whether a name is part of a listed device name, but not one itself.
+    
+    Typos don't count: a name that is merely similar to a listed device may
+    belong to a device that was connected after the list was cached.
+    
+    Args:
+        name (str): The device name or query.
+        devices (list): List of available devices
+        
+    Returns:
+        bool: True if the name matches a device case-insensitively, is a
+            prefix of a device or word, or is contained in a device name.
+    """
+    if name in devices:
+        return False
+    index = device_index(devices)
+    name_lower = name.lower()
+    return name_lower in index.exact or bool(index.completions(name, limit=1) or index.containing(name_lower))
+
+def switch_device(name: str):
+    """
+    Switch the audio output device to the given name.
+    
+    The exact name is tried first without listing devices, unless the cached
+    device list is still valid and the name is only part of a cached device
+    name. If the exact device name is not found, attempts to find the closest
+    match using fuzzy matching algorithms, using the cached device list when
+    it is still valid.
+    
+    Args:
+        name (str): The name of the audio output device to switch to
+    """
+    # Aliases from the configuration file are a single dictionary lookup
+    name = resolve_alias(name)
+
+    # Fast path: scripted calls usually pass the exact device name, which can
+    # be switched to without listing all devices first. Short queries like
+    # "air" would only fail, so they go straight to the cached device list.
+    devices = load_cached_devices()
+    if not (devices is not None and is_partial_name(name, devices)) and try_switch_device(name):
+        finish_switch(name)
+        return
+    
+    # Resolve the name against the cached device list without listing devices
+    if devices is not None:
+        closest_match = resolve_device_name(name, devices)
+        if closest_match is not None and closest_match != name and try_switch_device(closest_match):
+            print(f"Similar device found: '{closest_match}'")
+            finish_switch(closest_match)
+            return
+        # The cached list led to an unknown or unusable device, so it is stale
+        invalidate_device_cache()
+    
+    # Otherwise get all available devices
+    devices = list_devices(use_cache=False)
+    
+    # Check if the exact device exists
+    if name in devices:
+        # Exact device found, switch directly
+        try:
+            with metrics.timer("switch"):
+                subprocess.run(
+                    ['SwitchAudioSource', '-t', 'output', '-s', name],
+                    check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    text=True
+                )
+            finish_switch(name)
+            return
+        except subprocess.CalledProcessError as e:
+            print(f"Error switching device: {e.stderr}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        # No exact device found, search for a similar one
+        closest_match = resolve_device_name(name, devices)
+        
+        if closest_match:
+            # Similar device found, switch automatically
+            try:
+                with metrics.timer("switch"):
+                    subprocess.run(
+                        ['SwitchAudioSource', '-t', 'output', '-s', closest_match],
+                        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                        text=True
+                    )
+                print(f"Similar device found: '{closest_match}'")
+                finish_switch(closest_match)
+                return
+            except subprocess.CalledProcessError as e:
+                print(f"Error switching device: {e.stderr}", file=sys.stderr)
+                sys.exit(1)
+        else:
+            # No similar device found
+            error_msg = f"No matching device found for '{name}'."
+            error_msg += "\n\nAvailable devices:"
+            for device in devices:
+                error_msg += f"\n  • {device}"
+            
+            print(error_msg, file=sys.stderr)
+            sys.exit(1)
+
+def switch_to_preferred():
+    """
+    Switches to the first available device of the configured preferred list.
+    """
+    preferred = load_config().preferred
+    if not preferred:
+        print(f"Error: No preferred devices are configured in {config.CONFIG_FILE}", file=sys.stderr)
+        sys.exit(1)
+
+    def switch_to_first(devices):
+        for device in preferred:
+            if device in devices and try_switch_device(device):
+                finish_switch(device)
+                return True
+        return False
+
+    # Try the cached device list first and a fresh one if it is stale
+    devices = load_cached_devices()
+    if devices is not None:
+        if switch_to_first(devices):
+            return
+        invalidate_device_cache()
+    if switch_to_first(list_devices(use_cache=False)):
+        return
+
+    error_msg = "None of the preferred devices is available:"
+    for device in preferred:
+        error_msg += f"\n  • {device}"
+    print(error_msg, file=sys.stderr)
+    sys.exit(1)
@@ -0,0 +1,146 @@
+"""Named pipe listener for hotkey tools."""
+import contextlib
+import os
+import select
+import signal
+import stat
+import sys
+
+from .backend import adjust_volume, set_volume, toggle_mute
+from .cache import CACHE_DIR
+from .capture import call_captured
+from .config import watch_config
+from .devices import switch_device
+
+# Named pipe the FIFO listener reads commands from by default
+DEFAULT_FIFO = os.path.join(CACHE_DIR, "commands.fifo")
+
+def parse_fifo_command(line):
+    """
+    Parses a line written to the command FIFO.
+    
+    Commands mirror the command line options:
+        switch NAME   Switch device (with fuzzy matching)
+        vol N         Set volume to N
+        vol +N        Increase volume by N (vol -N decreases it)
+        mute          Toggle mute
+    
+    Args:
+        line (str): A single line without the line break.
+        
+    Returns:
+        tuple: The action ("switch", "set_volume", "adjust_volume" or "mute") and its argument.
+        
+    Raises:
+        ValueError: If the line is not a valid command.
+    """
+    command, _, argument = line.strip().partition(" ")
+    argument = argument.strip()
+    if command == "switch" and argument:
+        return ("switch", argument)
+    if command == "vol" and argument:
+        if argument[0] in "+-":
+            return ("adjust_volume", int(argument))
+        return ("set_volume", int(argument))
+    if command == "mute" and not argument:
+        return ("mute", None)
+    raise ValueError(f"unknown command: {line.strip()!r}")
+
+def coalesce_commands(commands):
+    """
+    Merges consecutive volume commands of a burst into a single command.
+    
+    Relative changes are summed up, and an absolute volume replaces everything
+    before it, so holding a hotkey results in one volume change.
+    
+    Args:
+        commands (list): (action, argument) tuples in arrival order.
+        
+    Returns:
+        list: The commands to execute, in order.
+    """
+    merged = []
+    for action, argument in commands:
+        if merged and action in ("set_volume", "adjust_volume") \
+                and merged[-1][0] in ("set_volume", "adjust_volume"):
+            previous_action, previous_argument = merged[-1]
+            if action == "adjust_volume" and previous_action == "set_volume":
+                merged[-1] = ("set_volume", max(0, min(100, previous_argument + argument)))
+            elif action == "adjust_volume":
+                merged[-1] = ("adjust_volume", previous_argument + argument)
+            else:
+                merged[-1] = (action, argument)
+        else:
+            merged.append((action, argument))
+    return merged
+
+def run_fifo_listener(path):
+    """
+    Executes commands written to a named pipe until interrupted.
+    
+    Shell hotkey tools can then run `echo "vol +5" > FIFO` without starting
+    Python. All lines that arrived together are read at once and volume
+    commands among them are coalesced. Lines can be written in several parts;
+    only complete lines are executed. Writes of a whole line are atomic as
+    long as the line is shorter than PIPE_BUF (512 bytes on macOS).
+    
+    Args:
+        path (str): Path of the FIFO. It is created if it doesn't exist.
+    """
+    created = False
+    try:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            os.mkfifo(path, 0o600)
+            created = True
+        elif not stat.S_ISFIFO(os.stat(path).st_mode):
+            print(f"Error: {path} exists and is not a FIFO.", file=sys.stderr)
+            sys.exit(1)
+        # Opening for reading and writing keeps the pipe open between writers
+        fd = os.open(path, os.O_RDWR)
+    except OSError as e:
+        print(f"Error opening FIFO {path}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    watch_config()
+    print(f"Reading commands from {path}")
+    sys.stdout.flush()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    buffer = b""
+    try:
+        while True:
+            buffer += os.read(fd, 4096)
+            # Collect everything else of the burst that is already waiting
+            while select.select([fd], [], [], 0)[0]:
+                buffer += os.read(fd, 4096)
+            *lines, buffer = buffer.split(b"\n")
+
+            commands = []
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    commands.append(parse_fifo_command(line.decode("utf-8", "replace")))
+                except ValueError as e:
+                    print(f"Ignoring FIFO command: {e}", file=sys.stderr)
+
+            for action, argument in coalesce_commands(commands):
+                if action == "switch":
+                    call = call_captured(switch_device, argument, turn=True)
+                elif action == "set_volume":
+                    call = call_captured(set_volume, argument, turn=True)
+                elif action == "adjust_volume":
+                    call = call_captured(adjust_volume, argument, turn=True)
+                else:
+                    call = call_captured(toggle_mute, turn=True)
+                sys.stdout.write(call.stdout)
+                sys.stderr.write(call.stderr)
+                sys.stdout.flush()
+                sys.stderr.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.close(fd)
+        if created:
+            with contextlib.suppress(OSError):
+                os.remove(path)
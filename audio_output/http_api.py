@@ -0,0 +1,285 @@
+"""Local HTTP control API with a Server-Sent Events stream, and the metrics endpoint."""
+import contextlib
+import http.server
+import json
+import queue
+import sys
+import threading
+import urllib.parse
+
+from .backend import adjust_volume, get_audio_state, get_current_device, list_devices, set_volume, toggle_mute
+from .capture import call_captured
+from .config import watch_config
+from .devices import switch_device
+from .metrics import metrics
+
+# Seconds between checks for device and volume changes while clients
+# are subscribed to the event stream
+EVENT_POLL_INTERVAL = 1.0
+
+# Seconds between keep-alive comments on an idle event stream
+EVENT_KEEPALIVE_INTERVAL = 15.0
+
+class EventBroadcaster:
+    """
+    Pushes device and volume changes to the subscribers of the event stream.
+    
+    While at least one client is subscribed, a background thread polls the
+    current device and audio state and publishes an event whenever one of
+    them changes. refresh() checks immediately, e.g. after a command changed
+    something.
+    """
+
+    def __init__(self, interval=EVENT_POLL_INTERVAL):
+        self.interval = interval
+        self.subscribers = []
+        self.last = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def subscribe(self):
+        """
+        Registers a new subscriber.
+        
+        Returns:
+            queue.Queue: Receives (event, data) tuples, starting with the current state.
+        """
+        subscriber = queue.Queue()
+        with self._lock:
+            self.subscribers.append(subscriber)
+            for event, data in self.last.items():
+                subscriber.put((event, data))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Removes a subscriber registered with subscribe()."""
+        with self._lock:
+            with contextlib.suppress(ValueError):
+                self.subscribers.remove(subscriber)
+
+    def refresh(self):
+        """Checks for changes right away instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    def publish(self, event, data):
+        """Sends an event to all subscribers if its data changed."""
+        with self._lock:
+            if self.last.get(event) == data:
+                return
+            self.last[event] = data
+            for subscriber in self.subscribers:
+                subscriber.put((event, data))
+
+    def _poll(self):
+        while True:
+            with self._lock:
+                if not self.subscribers:
+                    self._thread = None
+                    self.last = {}
+                    return
+            self._wakeup.clear()
+            device = call_captured(get_current_device).result
+            state = call_captured(get_audio_state).result
+            self.publish("device", {"device": device})
+            if state is not None:
+                self.publish("volume", {"volume": state.output_volume, "muted": state.output_muted})
+            self._wakeup.wait(self.interval)
+
+class ControlRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handles requests to the local HTTP control API.
+    
+    Endpoints:
+        GET  /devices   List of available devices
+        GET  /current   Current device
+        POST /current   Switch device: {"device": "AirPods"}
+        GET  /volume    Volume and mute state
+        POST /volume    Set volume: {"level": 50}, or adjust it: {"delta": -10}
+        POST /mute      Toggle mute
+        GET  /events    Server-Sent Events stream of "device" and "volume" changes
+        GET  /metrics   Prometheus metrics
+    
+    Parameters are sent as a JSON body, and POST requests must declare
+    `Content-Type: application/json`. Web pages cannot send such requests to
+    another origin without a CORS preflight, which this server never answers,
+    and requests whose Host header is not this server's localhost address are
+    rejected so DNS rebinding cannot reach the API either. Connections are
+    kept alive between requests.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "select_audio_output"
+
+    def log_message(self, format, *args):
+        # Requests are not logged, errors are reported to the client
+        pass
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        port = self.server.server_address[1]
+        if self.headers.get("Host") not in (f"127.0.0.1:{port}", f"localhost:{port}"):
+            self.close_connection = True
+            self.send_json(403, {"ok": False, "error": "Requests must be addressed to 127.0.0.1 or localhost."})
+            return False
+        return True
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_metrics(self):
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_call(self, call, error_status=503, **data):
+        if call.code == 0:
+            self.send_json(200, dict(ok=True, message=call.stdout.strip(), **data))
+        else:
+            self.send_json(error_status, {"ok": False, "error": call.stderr.strip()})
+
+    def read_params(self):
+        path = urllib.parse.urlsplit(self.path).path
+        params = {}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            params = json.loads(self.rfile.read(length).decode("utf-8"))
+            if not isinstance(params, dict):
+                raise ValueError("the request body must be a JSON object")
+        return path.rstrip("/") or "/", params
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path.rstrip("/")
+        if path == "/devices":
+            call = call_captured(list_devices)
+            self.send_call(call, devices=call.result)
+        elif path == "/current":
+            call = call_captured(get_current_device)
+            self.send_json(200, {"ok": True, "device": call.result})
+        elif path == "/volume":
+            state = call_captured(get_audio_state).result
+            if state is None:
+                self.send_json(503, {"ok": False, "error": "Volume control is not available on this system."})
+            else:
+                self.send_json(200, {"ok": True, "volume": state.output_volume, "muted": state.output_muted})
+        elif path == "/events":
+            self.stream_events()
+        elif path == "/metrics":
+            self.send_metrics()
+        else:
+            self.send_json(404, {"ok": False, "error": f"Unknown endpoint: {path}"})
+
+    def do_POST(self):
+        if self.headers.get_content_type() != "application/json":
+            self.close_connection = True
+            self.send_json(415, {"ok": False, "error": "The request must have Content-Type: application/json."})
+            return
+        try:
+            path, params = self.read_params()
+            if path == "/current":
+                call = call_captured(switch_device, str(params["device"]), turn=True)
+                self.send_call(call, error_status=404)
+            elif path == "/volume" and "level" in params:
+                call = call_captured(set_volume, int(params["level"]), turn=True)
+                self.send_call(call._replace(code=0 if call.result else 1))
+            elif path == "/volume" and "delta" in params:
+                call = call_captured(adjust_volume, int(params["delta"]), turn=True)
+                self.send_call(call._replace(code=0 if call.result else 1))
+            elif path == "/mute":
+                call = call_captured(toggle_mute, turn=True)
+                self.send_call(call._replace(code=0 if call.result is not None else 1), muted=call.result)
+            else:
+                self.send_json(404, {"ok": False, "error": f"Unknown endpoint or missing parameter: {path}"})
+                return
+        except (KeyError, ValueError, TypeError) as e:
+            self.send_json(400, {"ok": False, "error": f"Invalid request: {e}"})
+            return
+        self.server.events.refresh()
+
+    def stream_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.close_connection = True
+        subscriber = self.server.events.subscribe()
+        try:
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=EVENT_KEEPALIVE_INTERVAL)
+                    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                except queue.Empty:
+                    message = ": keep-alive\n\n"
+                self.wfile.write(message.encode("utf-8"))
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            self.server.events.unsubscribe(subscriber)
+
+def run_http_server(port):
+    """
+    Runs the HTTP control API on localhost until it is interrupted.
+    
+    Args:
+        port (int): The TCP port to listen on (0 picks a free port).
+    """
+    try:
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", port), ControlRequestHandler)
+    except (OSError, OverflowError) as e:
+        print(f"Error starting the HTTP API on port {port}: {e}", file=sys.stderr)
+        sys.exit(1)
+    server.daemon_threads = True
+    server.events = EventBroadcaster()
+    watch_config()
+    print(f"HTTP control API listening on http://127.0.0.1:{server.server_address[1]}")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+class MetricsRequestHandler(ControlRequestHandler):
+    """Serves only the /metrics endpoint for --metrics."""
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path.rstrip("/")
+        if path == "/metrics":
+            self.send_metrics()
+        else:
+            self.send_json(404, {"ok": False, "error": f"Unknown endpoint: {path}"})
+
+    def do_POST(self):
+        self.send_json(405, {"ok": False, "error": "Only GET /metrics is supported."})
+
+def start_metrics_server(port):
+    """
+    Serves the Prometheus metrics of this process on localhost in a background thread.
+    
+    Args:
+        port (int): The TCP port to listen on (0 picks a free port).
+    """
+    try:
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", port), MetricsRequestHandler)
+    except (OSError, OverflowError) as e:
+        print(f"Error starting the metrics server on port {port}: {e}", file=sys.stderr)
+        sys.exit(1)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics available on http://127.0.0.1:{server.server_address[1]}/metrics")
+    sys.stdout.flush()
@@ -0,0 +1,122 @@
+"""Interactive mode: selection using arrow keys."""
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .backend import (
+    adjust_volume, device_supports, get_audio_state, get_current_device, get_volume,
+    list_devices, load_capabilities, print_volume_unavailable, set_volume, toggle_mute
+)
+from .coordination import command_turn
+from .devices import switch_device
+
+def interactive_mode():
+    """
+    Interactive mode: Selection using arrow keys via questionary.
+    
+    Displays a list of available devices and additional options for volume control
+    and mute toggling. The user can navigate through the list with arrow keys and
+    select an option with Enter.
+    """
+    # Imported here because loading questionary is slow and no other mode needs it
+    import questionary
+
+    def probe_audio_state():
+        # Skip the probe if the current device is known to support neither
+        # volume nor mute, because a failing probe tries every variant
+        if not all(
+            record.get("volume_readable") is not False and record.get("mute_supported") is not False
+            for record in load_capabilities().values()
+        ):
+            device = current_probe.result()
+            if not device_supports("volume_readable", device) and not device_supports("mute_supported", device):
+                return None
+            return get_audio_state(device)
+        return get_audio_state()
+
+    # Run the startup probes concurrently, so the menu appears after the
+    # slowest probe instead of after the sum of all of them
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        devices_probe = executor.submit(list_devices)
+        current_probe = executor.submit(get_current_device)
+        # Test if mute and volume functionality is available
+        # Both are probed with a single query without actually changing anything
+        state_probe = executor.submit(probe_audio_state)
+        devices = devices_probe.result()
+        current_device = current_probe.result()
+        state = state_probe.result()
+
+    if not devices:
+        print("No audio output devices found.", file=sys.stderr)
+        sys.exit(1)
+    
+    # Create options with marking of the active device
+    choices = []
+    for device in devices:
+        if device == current_device:
+            choices.append(f"{device} (active)")
+        else:
+            choices.append(device)
+    
+    # Only add mute option if the functionality is available
+    if state is not None and state.output_muted is not None:
+        choices.append("-- Toggle mute --")
+    
+    # Only add volume options if the functionality is available
+    if state is not None and state.output_volume is not None:
+        choices.append("-- Show volume --")
+        choices.append("-- Increase volume (+10%) --")
+        choices.append("-- Decrease volume (-10%) --")
+        choices.append("-- Adjust volume... --")
+    else:
+        print_volume_unavailable()
+
+    choice = questionary.select(
+        "Please select audio output device:",
+        choices=choices
+    ).ask()
+
+    if choice is None:
+        # Abort with ESC or Ctrl+C
+        print("Aborted.", file=sys.stderr)
+        sys.exit(1)
+
+    # Audio control options
+    if choice == "-- Toggle mute --":
+        with command_turn():
+            toggle_mute()
+        return
+    elif choice == "-- Show volume --":
+        volume = get_volume()
+        if volume is not None:
+            print(f"Current volume: {volume}%")
+        return
+    elif choice == "-- Increase volume (+10%) --":
+        with command_turn():
+            adjust_volume(10)
+        return
+    elif choice == "-- Decrease volume (-10%) --":
+        with command_turn():
+            adjust_volume(-10)
+        return
+    elif choice == "-- Adjust volume... --":
+        # Ask user for volume value
+        volume_input = questionary.text(
+            "Enter volume (0-100%):",
+            validate=lambda text: text.isdigit() and 0 <= int(text) <= 100
+        ).ask()
+        
+        if volume_input is None:
+            print("Aborted.", file=sys.stderr)
+            return
+            
+        with command_turn():
+            set_volume(int(volume_input))
+        return
+        
+    # If "(active)" is part of the selection, remove it
+    if " (active)" in choice:
+        choice = choice.replace(" (active)", "")
+
+    with command_turn():
+        switch_device(choice)
@@ -0,0 +1,523 @@
+"""Indexes over a device list for fast exact, prefix, substring and fuzzy matching."""
+import collections
+import difflib
+import sys
+
+from .metrics import metrics
+
+metrics.describe("select_audio_output_deletion_index_entries", "gauge",
+                 "Deletions stored by the symspell matching strategy for the current device list.")
+metrics.describe("select_audio_output_deletion_index_bytes", "gauge",
+                 "Estimated memory used by the symspell matching strategy for the current device list.")
+
+def normalize_device_name(name):
+    """Casefolds a device name and collapses its whitespace for edit distance matching."""
+    return " ".join(name.casefold().split())
+
+def levenshtein(a, b):
+    """
+    Computes the Levenshtein edit distance between two strings.
+    
+    Returns:
+        int: The number of insertions, deletions and substitutions needed.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+def bounded_levenshtein(a, b, limit):
+    """
+    Computes the Levenshtein distance if it is at most limit.
+    
+    Only the diagonal band of width 2 * limit + 1 of the distance matrix can
+    hold values up to limit, so only that band is computed.
+    
+    Returns:
+        int: The distance, or limit + 1 if the strings are further apart.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    too_far = limit + 1
+    if len(a) - len(b) > limit:
+        return too_far
+    previous = [j if j <= limit else too_far for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != b[j - 1]), too_far)
+        if min(current) > limit:
+            return too_far
+        previous = current
+    return previous[-1]
+
+class BKTree:
+    """
+    Burkhard-Keller tree that finds all words within an edit distance.
+    
+    Each child is stored under its distance to the parent. Because the
+    Levenshtein distance is a metric, a search only has to descend into
+    children whose distance differs from the query's distance to the parent
+    by at most the maximum distance.
+    """
+
+    def __init__(self, words=()):
+        # Nodes are (word, {distance: child node}) tuples
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        """Inserts a word, ignoring duplicates."""
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """
+        Finds the words within max_distance edits of a word.
+        
+        Returns:
+            list: (distance, word) tuples, closest first.
+        """
+        results = []
+        pending = [self.root] if self.root else []
+        while pending:
+            candidate, children = pending.pop()
+            distance = levenshtein(word, candidate)
+            if distance <= max_distance:
+                results.append((distance, candidate))
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) <= max_distance:
+                    pending.append(child)
+        return sorted(results)
+
+# Number of leading characters of a word whose deletions are stored. Longer
+# words are told apart by the verification of their full edit distance, so
+# every word adds at most sum(C(7, i) for i <= 2) = 29 entries.
+DELETION_PREFIX_LENGTH = 7
+
+# Largest edit distance the deletion dictionary supports
+DELETION_MAX_DISTANCE = 2
+
+class DeletionIndex:
+    """
+    SymSpell-style dictionary that finds words within an edit distance by
+    hash lookups.
+    
+    Two words are at most n edits apart only if deleting at most n
+    characters from each of them leads to the same string. All deletions of
+    every word are therefore stored up front, and a query only looks up its
+    own deletions. The candidates are then verified with bounded_levenshtein().
+    """
+
+    def __init__(self, words, max_distance=DELETION_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.words = 0
+        # Maps each deletion to the words it was generated from
+        self.deletions = {}
+        for word in words:
+            self.words += 1
+            for deletion in self.deletions_of(word):
+                self.deletions.setdefault(deletion, []).append(word)
+
+    def deletions_of(self, word):
+        """Returns the word prefix and all strings reachable by deleting up to max_distance characters."""
+        prefix = word[:DELETION_PREFIX_LENGTH]
+        results = {prefix}
+        frontier = {prefix}
+        for _ in range(self.max_distance):
+            frontier = {text[:i] + text[i + 1:] for text in frontier for i in range(len(text))}
+            results.update(frontier)
+        return results
+
+    def lookup(self, word, max_distance):
+        """
+        Finds the words within max_distance edits of a word.
+        
+        Args:
+            word (str): The word to search for.
+            max_distance (int): The maximum number of edits, at most the
+                distance the index was built for.
+            
+        Returns:
+            list: (distance, word) tuples, closest first.
+        """
+        candidates = set()
+        for deletion in self.deletions_of(word):
+            candidates.update(self.deletions.get(deletion, ()))
+        results = []
+        for candidate in candidates:
+            distance = bounded_levenshtein(word, candidate, max_distance)
+            if distance <= max_distance:
+                results.append((distance, candidate))
+        return sorted(results)
+
+    def memory_usage(self):
+        """
+        Reports the size of the dictionary.
+        
+        Returns:
+            dict: The number of words, of stored deletions, and an estimate of
+            the bytes used by the dictionary.
+        """
+        size = sys.getsizeof(self.deletions)
+        for deletion, words in self.deletions.items():
+            size += sys.getsizeof(deletion) + sys.getsizeof(words)
+        return {"words": self.words, "entries": len(self.deletions), "bytes": size}
+
+class PrefixTrie:
+    """
+    Trie over casefolded device names and their words for completions.
+    
+    Every node keeps the positions of the devices below it, already ranked,
+    so a completion takes O(prefix length + results) time. Devices whose
+    full name starts with the prefix rank before devices with a later word
+    that starts with it, then shorter names and earlier devices come first.
+    """
+
+    def __init__(self, devices):
+        self.devices = list(devices)
+        # Nodes are (children, ranked device positions) tuples
+        self.root = ({}, [])
+        for position, device in enumerate(self.devices):
+            name = device.casefold()
+            terms = [(False, name)] + [(True, word) for word in name.split()]
+            for is_word, term in terms:
+                key = (is_word, len(device), position)
+                node = self.root
+                node[1].append(key)
+                for char in term:
+                    node = node[0].setdefault(char, ({}, []))
+                    node[1].append(key)
+
+        # Rank the devices of every node once, keeping the best entry per device
+        pending = [self.root]
+        while pending:
+            children, keys = pending.pop()
+            ranked, seen = [], set()
+            for key in sorted(keys):
+                if key[-1] not in seen:
+                    seen.add(key[-1])
+                    ranked.append(key[-1])
+            keys[:] = ranked
+            pending.extend(children.values())
+
+    def complete(self, prefix, limit=None):
+        """
+        Returns the devices whose name, or one of whose words, starts with
+        a prefix.
+        
+        Args:
+            prefix (str): The beginning of a device name or word.
+            limit (int): The maximum number of completions, or None for all.
+            
+        Returns:
+            list: The matching device names, best match first.
+        """
+        node = self.root
+        for char in prefix.casefold():
+            node = node[0].get(char)
+            if node is None:
+                return []
+        return [self.devices[position] for position in node[1][:limit]]
+
+# Device lists from this size on are scored with NumPy if it is installed,
+# because importing NumPy takes longer than scoring a few devices in Python
+VECTORIZE_MIN_DEVICES = 500
+
+# NumPy module, False if it is not installed, loaded lazily
+_numpy = None
+
+def load_numpy():
+    """
+    Imports NumPy, which is an optional dependency.
+    
+    Returns:
+        module: The numpy module, or None if it is not installed.
+    """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+# Number of devices that the fuzzy matching stage scores first, chosen by
+# the number of trigrams they share with the query
+FUZZY_CANDIDATES = 5
+
+class DeviceIndex:
+    """
+    Lookup structures over a device list for find_closest_device.
+    
+    The index is built once per device list. Exact matches are a dictionary
+    lookup, prefixes are completed with a PrefixTrie, and a trigram inverted
+    index provides candidates for the substring and fuzzy matching stages,
+    so that not every device has to be compared with the query. The results
+    are the same as those of a linear scan with difflib.get_close_matches.
+    """
+
+    def __init__(self, devices):
+        self.devices = list(devices)
+        # Built on first use by the prefix, vectorized and edit distance
+        # strategies
+        self.trie = None
+        self.char_columns = None
+        self.char_counts = None
+        self.lengths = None
+        self.bktree = None
+        self.normalized = None
+        self.deletion_index = None
+        self.terms = None
+        self.lowered = [device.lower() for device in self.devices]
+        # First device for each lowercased name, like the linear scan
+        self.exact = {}
+        self.trigrams = {}
+        for position, lowered in enumerate(self.lowered):
+            self.exact.setdefault(lowered, self.devices[position])
+            for trigram in self.split(lowered):
+                self.trigrams.setdefault(trigram, []).append(position)
+
+    @staticmethod
+    def split(text):
+        """Returns the set of trigrams of a string."""
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def containing(self, name_lower):
+        """
+        Returns the devices that contain the lowercased query, in list order.
+        
+        Every device that contains the query also contains all of its
+        trigrams, so only the intersection of their posting lists is checked.
+        """
+        trigrams = self.split(name_lower)
+        if not trigrams:
+            positions = range(len(self.devices))
+        else:
+            postings = sorted((self.trigrams.get(trigram, []) for trigram in trigrams), key=len)
+            positions = set(postings[0])
+            for posting in postings[1:]:
+                positions.intersection_update(posting)
+                if not positions:
+                    break
+            positions = sorted(positions)
+        return [self.devices[position] for position in positions if name_lower in self.lowered[position]]
+
+    def closest(self, name, cutoff, vectorize=True):
+        """
+        Returns the device that difflib.get_close_matches would rank first.
+        
+        Large device lists are scored with closest_vectorized() when NumPy is
+        installed. Otherwise, the devices sharing the most trigrams with the
+        query are scored first. Their best ratio raises the cutoff for the
+        remaining devices, most of which are then ruled out by difflib's cheap
+        upper bounds instead of a full comparison.
+        
+        Args:
+            name (str): The device name to search for.
+            cutoff (float): The minimum similarity ratio.
+            
+        Returns:
+            str: The most similar device, or None if none reaches the cutoff.
+        """
+        if vectorize and len(self.devices) >= VECTORIZE_MIN_DEVICES and load_numpy():
+            return self.closest_vectorized(name, cutoff)
+
+        shared = collections.Counter()
+        for trigram in self.split(name.lower()):
+            shared.update(self.trigrams.get(trigram, ()))
+        candidates = [position for position, _ in shared.most_common(FUZZY_CANDIDATES)]
+        remaining = set(range(len(self.devices))).difference(candidates)
+
+        # Same comparison direction and tie-breaking (higher score, then the
+        # greater name) as difflib.get_close_matches
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(name)
+        best = None
+        for position in candidates + sorted(remaining):
+            device = self.devices[position]
+            threshold = cutoff if best is None else best[0]
+            matcher.set_seq1(device)
+            if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                continue
+            score = matcher.ratio()
+            if score >= cutoff and (best is None or (score, device) > best):
+                best = (score, device)
+        return best[1] if best else None
+
+    def closest_vectorized(self, name, cutoff):
+        """
+        Returns the device that difflib.get_close_matches would rank first,
+        using NumPy.
+        
+        The device names are stored as a matrix of character counts. For a
+        query, one batched operation over the columns of its characters gives
+        difflib's quick_ratio() of every device, an upper bound of ratio().
+        Only devices in descending order of that bound get a full
+        SequenceMatcher comparison, until the bound falls below the best ratio
+        found. The result is therefore identical to difflib's ranking, with
+        the same tie-breaking.
+        
+        Args:
+            name (str): The device name to search for.
+            cutoff (float): The minimum similarity ratio.
+            
+        Returns:
+            str: The most similar device, or None if none reaches the cutoff.
+        """
+        numpy = load_numpy()
+        if self.char_counts is None:
+            # One row per character (so that a row is contiguous), one column per device
+            self.char_columns = {}
+            rows = []
+            for position, device in enumerate(self.devices):
+                for char, count in collections.Counter(device).items():
+                    row = self.char_columns.setdefault(char, len(rows))
+                    if row == len(rows):
+                        rows.append(numpy.zeros(len(self.devices), dtype=numpy.int32))
+                    rows[row][position] = count
+            self.char_counts = numpy.array(rows, dtype=numpy.int32).reshape(len(rows), len(self.devices))
+            self.lengths = numpy.array([len(device) for device in self.devices], dtype=numpy.int64)
+
+        common = numpy.zeros(len(self.devices), dtype=numpy.int64)
+        for char, count in collections.Counter(name).items():
+            row = self.char_columns.get(char)
+            if row is not None:
+                common += numpy.minimum(self.char_counts[row], count)
+        total = self.lengths + len(name)
+        # Same formula as difflib, including a ratio of 1 for two empty strings
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            bounds = numpy.where(total > 0, 2.0 * common / total, 1.0)
+
+        candidates = numpy.flatnonzero(bounds >= cutoff)
+        candidates = candidates[numpy.argsort(-bounds[candidates], kind="stable")]
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(name)
+        best = None
+        for position in candidates.tolist():
+            if best is not None and bounds[position] < best[0]:
+                break
+            device = self.devices[position]
+            matcher.set_seq1(device)
+            score = matcher.ratio()
+            if score >= cutoff and (best is None or (score, device) > best):
+                best = (score, device)
+        return best[1] if best else None
+
+    def nearest(self, name, max_distance):
+        """
+        Returns the device with the fewest edits from the query.
+        
+        Names are compared after normalize_device_name. Among equally close
+        devices, the shortest one wins, like in the substring stage.
+        
+        Args:
+            name (str): The device name to search for.
+            max_distance (int): The maximum number of edits.
+            
+        Returns:
+            str: The closest device, or None if none is within max_distance.
+        """
+        if self.bktree is None:
+            self.normalized = {}
+            for position, device in enumerate(self.devices):
+                self.normalized.setdefault(normalize_device_name(device), []).append(position)
+            self.bktree = BKTree(self.normalized)
+        results = self.bktree.search(normalize_device_name(name), max_distance)
+        if not results:
+            return None
+        positions = [
+            position
+            for distance, normalized in results if distance == results[0][0]
+            for position in self.normalized[normalized]
+        ]
+        return self.devices[min(positions, key=lambda position: (len(self.devices[position]), position))]
+
+    def corrected(self, name, max_distance):
+        """
+        Returns the device whose name, or one of whose words, is closest to the query.
+        
+        Matches of the full name win over matches of a single word with the
+        same number of edits, then the shortest device wins.
+        
+        Args:
+            name (str): The device name to search for.
+            max_distance (int): The maximum number of edits, at most
+                DELETION_MAX_DISTANCE.
+            
+        Returns:
+            str: The closest device, or None if none is within max_distance.
+        """
+        if self.deletion_index is None:
+            # Maps each normalized name and word to (is_word, position) pairs
+            self.terms = {}
+            for position, device in enumerate(self.devices):
+                normalized = normalize_device_name(device)
+                self.terms.setdefault(normalized, set()).add((False, position))
+                for word in normalized.split():
+                    self.terms.setdefault(word, set()).add((True, position))
+            self.deletion_index = DeletionIndex(self.terms)
+            usage = self.deletion_index.memory_usage()
+            metrics.set("select_audio_output_deletion_index_entries", usage["entries"])
+            metrics.set("select_audio_output_deletion_index_bytes", usage["bytes"])
+        best = None
+        for distance, term in self.deletion_index.lookup(normalize_device_name(name), max_distance):
+            for is_word, position in self.terms[term]:
+                key = (distance, is_word, len(self.devices[position]), position)
+                if best is None or key < best:
+                    best = key
+        return self.devices[best[-1]] if best else None
+
+    def completions(self, prefix, limit=None):
+        """
+        Returns the devices whose name, or one of whose words, starts with
+        a prefix.
+        
+        Args:
+            prefix (str): The beginning of a device name or word.
+            limit (int): The maximum number of completions, or None for all.
+            
+        Returns:
+            list: The matching device names, best match first.
+        """
+        if self.trie is None:
+            self.trie = PrefixTrie(self.devices)
+        return self.trie.complete(prefix, limit)
+
+# Index of the most recently searched device list
+_device_index = None
+
+def device_index(devices):
+    """
+    Returns the DeviceIndex for a device list, reusing it while the list is unchanged.
+    
+    Args:
+        devices (list): List of available devices
+        
+    Returns:
+        DeviceIndex: The index over the devices.
+    """
+    global _device_index
+    if _device_index is None or _device_index.devices != devices:
+        _device_index = DeviceIndex(devices)
+    return _device_index
@@ -0,0 +1,104 @@
+"""Prometheus metrics collected by all commands and long-running modes."""
+import contextlib
+import threading
+import time
+
+class MetricsRegistry:
+    """
+    Collects counters and latency histograms in memory.
+    
+    The values are exposed in the Prometheus text format by long-running
+    modes started with --metrics. Recording is cheap enough to stay enabled
+    in every mode.
+    """
+
+    # Upper bounds of the latency histogram buckets, in seconds
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.descriptions = {}
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, text):
+        """Registers the type ("counter", "gauge" or "histogram") and help text of a metric."""
+        self.descriptions[name] = (kind, text)
+
+    def inc(self, name, amount=1, **labels):
+        """Increases a counter."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self.counters.setdefault(name, {})
+            values[key] = values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """Sets a gauge."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.counters.setdefault(name, {})[key] = value
+
+    def observe(self, name, value, **labels):
+        """Records a value in a histogram."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self.histograms.setdefault(name, {})
+            buckets = values.setdefault(key, [0] * len(self.BUCKETS) + [0.0, 0])
+            for index, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    buckets[index] += 1
+            buckets[-2] += value
+            buckets[-1] += 1
+
+    @contextlib.contextmanager
+    def timer(self, operation):
+        """Measures the duration of a backend operation."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe("select_audio_output_backend_duration_seconds",
+                         time.monotonic() - started, operation=operation)
+
+    def render(self):
+        """
+        Renders all metrics in the Prometheus text exposition format.
+        
+        Returns:
+            str: The metrics page.
+        """
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (
+                '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                for key, value in pairs
+            )
+            return "{" + ",".join(escaped) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted(self.descriptions):
+                kind, text = self.descriptions[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind != "histogram":
+                    for labels, value in sorted(self.counters.get(name, {}).items()):
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+                else:
+                    for labels, buckets in sorted(self.histograms.get(name, {}).items()):
+                        for bound, count in zip(self.BUCKETS, buckets):
+                            lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {count}")
+                        lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {buckets[-1]}")
+                        lines.append(f"{name}_sum{format_labels(labels)} {buckets[-2]}")
+                        lines.append(f"{name}_count{format_labels(labels)} {buckets[-1]}")
+        return "\n".join(lines) + "\n"
+
+# Metrics of this process. Metrics that several modules record are described
+# here, the others in the module that records them.
+metrics = MetricsRegistry()
+metrics.describe("select_audio_output_backend_duration_seconds", "histogram",
+                 "Duration of SwitchAudioSource and AppleScript operations.")
+metrics.describe("select_audio_output_cache_requests_total", "counter",
+                 "Cache lookups, by cache and result (hit or miss).")
@@ -0,0 +1,211 @@
+"""OSC listener for hardware controllers."""
+import collections
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+
+from .backend import set_volume, toggle_mute
+from .capture import call_captured
+from .config import watch_config
+from .devices import switch_device
+
+def read_osc_string(data, offset):
+    """
+    Reads a null-terminated, 4-byte aligned OSC string.
+    
+    Returns:
+        tuple: The string and the offset behind its padding.
+    """
+    end = data.index(b"\0", offset)
+    return data[offset:end].decode("utf-8"), (end + 4) & ~3
+
+def parse_osc_packet(data):
+    """
+    Decodes an OSC packet, which is either a single message or a bundle.
+    
+    Args:
+        data (bytes): The content of a UDP datagram.
+        
+    Yields:
+        tuple: The address and list of arguments of each contained message.
+        
+    Raises:
+        ValueError: If the packet is malformed or uses unsupported types.
+    """
+    if data.startswith(b"#bundle\0"):
+        # Skip the "#bundle" string and the time tag; elements are size-prefixed
+        offset = 16
+        while offset + 4 <= len(data):
+            size = struct.unpack(">i", data[offset:offset + 4])[0]
+            offset += 4
+            yield from parse_osc_packet(data[offset:offset + size])
+            offset += size
+        return
+
+    address, offset = read_osc_string(data, 0)
+    tags = ","
+    if offset < len(data):
+        tags, offset = read_osc_string(data, offset)
+    if not address.startswith("/") or not tags.startswith(","):
+        raise ValueError("not an OSC message")
+
+    arguments = []
+    try:
+        for tag in tags[1:]:
+            if tag in "fi":
+                arguments.append(struct.unpack(">" + tag, data[offset:offset + 4])[0])
+                offset += 4
+            elif tag in "dh":
+                arguments.append(struct.unpack(">" + ("d" if tag == "d" else "q"), data[offset:offset + 8])[0])
+                offset += 8
+            elif tag == "s":
+                value, offset = read_osc_string(data, offset)
+                arguments.append(value)
+            elif tag in "TF":
+                arguments.append(tag == "T")
+            else:
+                raise ValueError(f"unsupported OSC type tag: {tag}")
+    except struct.error:
+        raise ValueError("truncated OSC message")
+    yield address, arguments
+
+# Number of most recent end-to-end latencies kept for the statistics
+OSC_LATENCY_SAMPLES = 10000
+
+class OscListener:
+    """
+    Applies volume, mute and device commands received as OSC messages over UDP.
+    
+    Supported messages:
+        /volume f   Volume as 0.0-1.0 (or 0-100 for values above 1 and integers)
+        /mute       Toggle mute (an argument of 0 or false, e.g. a button release, is ignored)
+        /device s   Switch device (with fuzzy matching)
+    
+    Messages are received on one thread and applied in order on another.
+    Faders send many positions per second, so a volume message that arrives
+    while an older one is still waiting replaces it: only the newest position
+    is applied. Commands run through the persistent osascript coprocess.
+    """
+
+    def __init__(self, host, port):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+        self.received = 0
+        self.applied = 0
+        self.superseded = 0
+        self.latencies = collections.deque(maxlen=OSC_LATENCY_SAMPLES)
+        self.started = time.monotonic()
+        # Backend calls capture sys.stderr while they run, so keep the real one
+        self.log = sys.stderr
+
+    def enqueue(self, address, arguments):
+        """Queues a command, replacing a queued volume command with a newer one."""
+        with self.condition:
+            self.received += 1
+            if address == "/volume":
+                for item in list(self.pending):
+                    if item[0] == "/volume":
+                        self.pending.remove(item)
+                        self.superseded += 1
+            self.pending.append((address, arguments, time.monotonic()))
+            self.condition.notify()
+
+    def apply(self, address, arguments):
+        """
+        Executes a single OSC command.
+        
+        Returns:
+            CapturedCall: The outcome of the command, or None if the message was ignored.
+        """
+        if address == "/volume" and arguments and isinstance(arguments[0], (int, float)):
+            value = arguments[0]
+            if isinstance(value, float) and 0.0 <= value <= 1.0:
+                value *= 100
+            return call_captured(set_volume, int(round(value)), turn=True)
+        if address == "/mute":
+            if arguments and not arguments[0]:
+                return None
+            return call_captured(toggle_mute, turn=True)
+        if address == "/device" and arguments and isinstance(arguments[0], str):
+            return call_captured(switch_device, arguments[0], turn=True)
+        print(f"Ignoring unsupported OSC message: {address} {arguments}", file=self.log)
+        return None
+
+    def work(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                address, arguments, received_at = self.pending.popleft()
+            call = self.apply(address, arguments)
+            if call is None:
+                continue
+            with self.condition:
+                self.applied += 1
+                self.latencies.append(time.monotonic() - received_at)
+            if call.code != 0 and call.stderr:
+                self.log.write(call.stderr)
+                self.log.flush()
+
+    def statistics(self):
+        """
+        Summarizes the throughput and latency since the listener was started.
+        
+        Returns:
+            str: Message counts, messages per second and the end-to-end latency
+                from receiving a message to having applied it, over the last
+                OSC_LATENCY_SAMPLES applied messages.
+        """
+        with self.condition:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            latencies = sorted(self.latencies)
+            summary = (
+                f"{self.received} messages received ({self.received / elapsed:.1f}/s), "
+                f"{self.applied} applied, {self.superseded} superseded volume messages dropped"
+            )
+        if latencies:
+            median = latencies[len(latencies) // 2] * 1000
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+            summary += f"\nEnd-to-end latency: median {median:.1f} ms, 95th percentile {p95:.1f} ms"
+        return summary
+
+    def serve_forever(self):
+        threading.Thread(target=self.work, daemon=True).start()
+        while True:
+            data, _ = self.socket.recvfrom(65535)
+            try:
+                for address, arguments in parse_osc_packet(data):
+                    self.enqueue(address, arguments)
+            except ValueError as e:
+                print(f"Ignoring malformed OSC packet: {e}", file=self.log)
+
+def run_osc_listener(address):
+    """
+    Runs the OSC listener until it is interrupted, then prints its statistics.
+    
+    Args:
+        address (str): "PORT" or "HOST:PORT" to listen on. The host defaults to localhost.
+    """
+    host, _, port = address.rpartition(":")
+    try:
+        listener = OscListener(host or "127.0.0.1", int(port))
+    except (ValueError, OSError, OverflowError) as e:
+        print(f"Error starting the OSC listener on {address}: {e}", file=sys.stderr)
+        sys.exit(1)
+    host, port = listener.socket.getsockname()[:2]
+    watch_config()
+    print(f"OSC listener receiving on udp://{host}:{port}")
+    sys.stdout.flush()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        listener.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.socket.close()
+        print(listener.statistics())
@@ -0,0 +1,282 @@
+"""Preloaded zygote server that forks a child per command."""
+import array
+import contextlib
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import traceback
+
+from .cache import CACHE_DIR
+
+# Unix domain socket the zygote listens on
+ZYGOTE_SOCKET = os.environ.get("SELECT_AUDIO_OUTPUT_ZYGOTE_SOCKET") or os.path.join(CACHE_DIR, "zygote.sock")
+
+# Seconds a client waits to connect to the zygote and for its answers
+# before the command starts. A zygote that is stopped or stuck is bypassed
+# after this time.
+ZYGOTE_CONNECT_TIMEOUT = 1.0
+
+# Environment variables that the modules read when they are imported. The
+# zygote and the daemon only run commands whose values match their own,
+# because they execute them with modules set up with their own values
+SETTINGS_ENVIRONMENT_PREFIX = "SELECT_AUDIO_OUTPUT_"
+SETTINGS_ENVIRONMENT = ("HOME",)
+
+def settings_environment(env):
+    """Returns the variables of env that must match between a server and its client."""
+    return {
+        name: value for name, value in env.items()
+        if name.startswith(SETTINGS_ENVIRONMENT_PREFIX) or name in SETTINGS_ENVIRONMENT
+    }
+
+def send_message(connection, data, fds=()):
+    """
+    Sends a length-prefixed JSON message, optionally with file descriptors.
+    
+    Args:
+        connection (socket.socket): A connected Unix domain socket.
+        data: The JSON-serializable message.
+        fds (tuple): File descriptors passed along with the message.
+    """
+    payload = json.dumps(data).encode("utf-8")
+    header = struct.pack("!I", len(payload))
+    ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))] if fds else []
+    connection.sendmsg([header], ancillary)
+    connection.sendall(payload)
+
+def receive_message(connection, max_fds=0):
+    """
+    Receives a message sent with send_message().
+    
+    Args:
+        connection (socket.socket): A connected Unix domain socket.
+        max_fds (int): Maximum number of file descriptors to accept.
+        
+    Returns:
+        tuple: The decoded message and the list of received file descriptors.
+        
+    Raises:
+        ConnectionError: If the connection was closed before a complete message arrived.
+    """
+    fds = array.array("i")
+    header, ancillary, _, _ = connection.recvmsg(4, socket.CMSG_SPACE(max_fds * fds.itemsize))
+    for level, kind, data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - len(data) % fds.itemsize])
+    if len(header) < 4:
+        raise ConnectionError("connection closed")
+    length = struct.unpack("!I", header)[0]
+    payload = b""
+    while len(payload) < length:
+        chunk = connection.recv(length - len(payload))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        payload += chunk
+    return json.loads(payload.decode("utf-8")), list(fds)
+
+def run_zygote_child(connection, request, fds):
+    """
+    Runs one command line in a forked zygote child and never returns.
+    
+    The child takes over the client's stdin, stdout and stderr, working
+    directory and environment, so the command behaves exactly like a cold run
+    in the client's terminal. Its pid is reported first so the client can
+    forward signals, and the command only starts once the client confirms
+    that it is still waiting. The exit code is reported when main() returns.
+    
+    The child starts a new session without a controlling terminal. It would
+    otherwise stay in the zygote's background process group on the zygote's
+    terminal, and be stopped with SIGTTOU as soon as the interactive mode
+    changes the settings of that terminal.
+    """
+    os.setsid()
+    try:
+        send_message(connection, {"pid": os.getpid()})
+        # The client closes the connection instead if it gave up waiting
+        receive_message(connection)[0]["start"]
+    except (OSError, ValueError, KeyError):
+        os._exit(1)
+
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    sys.argv = [request["argv0"]] + request["argv"]
+    # Recreate the standard streams so buffering matches the client's files
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", closefd=False)
+    sys.stderr = open(2, "w", buffering=1, closefd=False, errors="backslashreplace")
+
+    code = 1
+    try:
+        from .cli import main
+        main(request["argv"])
+        code = 0
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+    except KeyboardInterrupt:
+        traceback.print_exc()
+        code = 130
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        with contextlib.suppress(Exception):
+            sys.stdout.flush()
+            sys.stderr.flush()
+        with contextlib.suppress(Exception):
+            send_message(connection, {"code": code})
+        os._exit(code)
+
+def run_zygote():
+    """
+    Runs the zygote server until it is interrupted.
+    
+    The zygote has already imported all modules, including questionary and
+    prompt_toolkit, and forks a child per client connection that runs main()
+    with the client's arguments, file descriptors, working directory and
+    environment. Clients whose settings in the environment differ from the
+    zygote's are refused and run the command themselves.
+    """
+    import questionary  # noqa: F401 - preloaded so children don't pay for it
+
+    if not hasattr(os, "fork"):
+        print("The zygote requires a system that supports fork().", file=sys.stderr)
+        sys.exit(1)
+
+    # Refuse to start twice, but replace a socket left behind by a crashed zygote
+    with contextlib.closing(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as probe:
+        if probe.connect_ex(ZYGOTE_SOCKET) == 0:
+            print(f"A zygote is already running on {ZYGOTE_SOCKET}", file=sys.stderr)
+            sys.exit(1)
+    os.makedirs(os.path.dirname(ZYGOTE_SOCKET), exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(ZYGOTE_SOCKET)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(ZYGOTE_SOCKET)
+    finally:
+        os.umask(old_umask)
+    server.listen(16)
+
+    environment = settings_environment(os.environ)
+    # Children are never waited for, let the system reap them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Zygote listening on {ZYGOTE_SOCKET}")
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        while True:
+            connection, _ = server.accept()
+            fds = []
+            try:
+                # A client that doesn't send its request in time can't block others
+                connection.settimeout(ZYGOTE_CONNECT_TIMEOUT)
+                send_message(connection, {"ready": True})
+                request, fds = receive_message(connection, max_fds=3)
+                if len(fds) != 3:
+                    continue
+                if settings_environment(request["env"]) != environment:
+                    send_message(connection, {"refused": "the environment differs from the zygote's"})
+                    continue
+                if os.fork() == 0:
+                    server.close()
+                    connection.settimeout(None)
+                    run_zygote_child(connection, request, fds)
+            except (OSError, ValueError, KeyError):
+                pass
+            finally:
+                connection.close()
+                for fd in fds:
+                    with contextlib.suppress(OSError):
+                        os.close(fd)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(ZYGOTE_SOCKET)
+
+def run_in_zygote(argv):
+    """
+    Executes a command line in a child of the running zygote.
+    
+    The child uses this process's stdin, stdout and stderr directly. Signals
+    received while waiting are forwarded to the child, including terminal
+    resizes. Suspending this process (Ctrl+Z) stops the child as well, and
+    it continues when this process does.
+    
+    Until the command has started, every step waits at most
+    ZYGOTE_CONNECT_TIMEOUT, and the command is only started after this
+    process confirmed it, so a zygote that doesn't answer in time is bypassed
+    without running the command twice.
+    
+    Args:
+        argv (list): The command line arguments without the program name.
+        
+    Returns:
+        int: The exit code of the command, or None if the command should be
+            executed in this process: no zygote is running, it didn't answer
+            in time, or it refused the command because the environment differs.
+    """
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    except (AttributeError, OSError):
+        return None
+
+    with client:
+        try:
+            client.settimeout(ZYGOTE_CONNECT_TIMEOUT)
+            client.connect(ZYGOTE_SOCKET)
+            if not receive_message(client)[0].get("ready"):
+                return None
+            send_message(client, {
+                "argv0": sys.argv[0],
+                "argv": argv,
+                "cwd": os.getcwd(),
+                "env": dict(os.environ),
+            }, fds=(0, 1, 2))
+            child = receive_message(client)[0]["pid"]
+            send_message(client, {"start": True})
+            client.settimeout(None)
+        except (OSError, ValueError, KeyError):
+            # The zygote didn't start the command, so it is safe to run it here
+            return None
+
+        def forward_signal(signum, frame):
+            with contextlib.suppress(OSError):
+                os.kill(child, signum)
+
+        def suspend(signum, frame):
+            # The child has no controlling terminal, so it has to be stopped
+            # explicitly before this process stops
+            with contextlib.suppress(OSError):
+                os.kill(child, signal.SIGSTOP)
+            signal.signal(signal.SIGTSTP, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTSTP)
+            # Continues here after SIGCONT, which is forwarded to the child
+            signal.signal(signal.SIGTSTP, suspend)
+
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGWINCH, signal.SIGCONT):
+            signal.signal(signum, forward_signal)
+        signal.signal(signal.SIGTSTP, suspend)
+        try:
+            return receive_message(client)[0]["code"]
+        except (OSError, ValueError, KeyError):
+            print("Error: the zygote child exited unexpectedly.", file=sys.stderr)
+            return 1
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compares the fuzzy matching strategies on generated device lists.
+
+For each list size, the script builds a DeviceIndex and measures the time per
+typo query of the BK-tree ("bktree"), the deletion dictionary ("symspell"),
+the indexed difflib strategy and a plain difflib.get_close_matches scan. The
+first query of an edit distance strategy also builds its index; that time is
+reported separately.
+
+Usage:
+    python3 benchmarks/fuzzy_matching.py [--sizes 10 1000 100000] [--queries N]
+"""
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from audio_output.matching import DeviceIndex  # noqa: E402
+
+WORDS = ["MacBook", "Pro", "Speakers", "AirPods", "HDMI", "Loopback", "BlackHole", "2ch",
+         "Aggregate", "Device", "Studio", "Display", "AirPlay", "Living", "Room", "USB",
+         "Headphones", "Kitchen", "Office", "Monitor", "Focusrite", "Scarlett", "Sonos", "Bose"]
+
+def device_names(rng, count):
+    """Generates count distinct device names from WORDS and a serial number."""
+    names = set()
+    while len(names) < count:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(1, 3))]
+        names.add(" ".join(words + [str(rng.randrange(10 ** len(str(count))))]))
+    return sorted(names)
+
+def typo(rng, text):
+    """Applies one or two random edits to text."""
+    chars = list(text)
+    for _ in range(rng.randint(1, 2)):
+        position = rng.randrange(len(chars))
+        operation = rng.randrange(3)
+        if operation == 0 and len(chars) > 1:
+            del chars[position]
+        elif operation == 1:
+            chars[position] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+        else:
+            chars.insert(position, rng.choice("abcdefghijklmnopqrstuvwxyz"))
+    return "".join(chars)
+
+def per_query(func, queries):
+    """Returns the mean seconds per query."""
+    started = time.perf_counter()
+    for query in queries:
+        func(query)
+    return (time.perf_counter() - started) / len(queries)
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the fuzzy matching strategies.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000],
+                        help="Numbers of devices (default: 10 1000 100000)")
+    parser.add_argument("--queries", type=int, default=20, help="Typo queries per size (default: 20)")
+    parser.add_argument("--max-distance", type=int, default=2, help="Maximum number of edits (default: 2)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    print(f"{'names':>8}  {'bktree build':>12}  {'bktree':>9}  {'symspell build':>14}  {'symspell':>9}  "
+          f"{'difflib':>9}  {'plain difflib':>13}")
+    for size in args.sizes:
+        devices = device_names(rng, size)
+        queries = [typo(rng, rng.choice(devices)) for _ in range(args.queries)]
+        index = DeviceIndex(devices)
+        bktree_build = timed(lambda: index.nearest(queries[0], args.max_distance))
+        bktree = per_query(lambda query: index.nearest(query, args.max_distance), queries)
+        symspell_build = timed(lambda: index.corrected(queries[0], args.max_distance))
+        symspell = per_query(lambda query: index.corrected(query, args.max_distance), queries)
+        indexed = per_query(lambda query: index.closest(query, 0.3, vectorize=False), queries)
+        plain = per_query(lambda query: difflib.get_close_matches(query, devices, n=3, cutoff=0.3), queries)
+        print(f"{size:>8}  {bktree_build * 1000:>10.1f}ms  {bktree * 1000:>7.2f}ms  "
+              f"{symspell_build * 1000:>12.1f}ms  {symspell * 1000:>7.2f}ms  "
+              f"{indexed * 1000:>7.2f}ms  {plain * 1000:>11.2f}ms")
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
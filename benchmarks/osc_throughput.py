@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Measures how the OSC listener copes with a fader burst.
+
+Sends /volume messages over UDP to an OscListener that runs in this process
+against the stand-in osascript and SwitchAudioSource from tests/stubs, and
+reports the message rate, how many backend writes were needed and the
+end-to-end latency from receiving a message to having applied it.
+
+Usage:
+    python3 benchmarks/osc_throughput.py [--messages N] [--rate PER_SECOND] [--delay SECONDS]
+"""
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUBS = os.path.join(ROOT, "tests", "stubs")
+
+def osc_message(address, value):
+    """Encodes an OSC message with a single float argument."""
+    def pad(data):
+        return data + b"\0" * (4 - len(data) % 4)
+    return pad(address.encode("ascii")) + pad(b",f") + struct.pack(">f", value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the OSC listener with a fader burst.")
+    parser.add_argument("--messages", type=int, default=300, help="Number of /volume messages (default: 300)")
+    parser.add_argument("--rate", type=float, default=100.0,
+                        help="Messages per second, 0 for as fast as possible (default: 100)")
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="Seconds the stand-in osascript needs per script (default: 0)")
+    args = parser.parse_args()
+
+    # The modules read their settings when they are imported
+    workdir = tempfile.mkdtemp(prefix="osc_throughput.")
+    state_file = os.path.join(workdir, "fakeaudio.json")
+    os.environ["PATH"] = STUBS + os.pathsep + os.environ["PATH"]
+    os.environ["FAKE_AUDIO_STATE"] = state_file
+    os.environ["SELECT_AUDIO_OUTPUT_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["SELECT_AUDIO_OUTPUT_CONFIG"] = os.path.join(workdir, "config.toml")
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, STUBS)
+    import fakeaudio
+    from audio_output.osc import OscListener
+
+    with open(state_file, "w") as f:
+        json.dump(dict(fakeaudio.DEFAULT, delays={"osascript": args.delay}), f)
+
+    listener = OscListener("127.0.0.1", 0)
+    threading.Thread(target=listener.serve_forever, daemon=True).start()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = listener.socket.getsockname()
+
+    # A fader moving from bottom to top and back
+    values = [1 - abs(i * 2 / max(args.messages - 1, 1) - 1) for i in range(args.messages)]
+    started = time.monotonic()
+    for i, value in enumerate(values):
+        if args.rate:
+            time.sleep(max(0.0, started + i / args.rate - time.monotonic()))
+        sender.sendto(osc_message("/volume", value), target)
+    sent = time.monotonic() - started
+
+    # Wait until every received message has been handled and no more arrive.
+    # Backend calls capture sys.stdout while they run, so nothing is printed
+    # before that. UDP messages sent faster than they are read can be lost.
+    last_received, quiet_since = -1, time.monotonic()
+    while True:
+        with listener.condition:
+            received = listener.received
+            idle = listener.applied + listener.superseded == received
+        if received != last_received:
+            last_received, quiet_since = received, time.monotonic()
+        elif idle and (received == args.messages or time.monotonic() - quiet_since > 1):
+            break
+        time.sleep(0.01)
+
+    state = fakeaudio.load()
+    print(f"Sent {args.messages} messages in {sent:.2f} s ({args.messages / max(sent, 1e-9):.1f}/s), "
+          f"{args.messages - last_received} lost")
+    print(listener.statistics())
+    print(f"Backend processes started: {sum(state['spawns'].values())} "
+          f"({state['spawns'].get('coprocess', 0)} coprocess, {state['spawns'].get('osascript', 0)} one-shot osascript)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Shared test setup.
+
+Every test gets its own cache directory and configuration file, and the
+module state that is normally kept for the lifetime of a process is reset.
+"""
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Stand-in osascript and SwitchAudioSource scripts
+STUBS = os.path.join(ROOT, "tests", "stubs")
+
+# The modules read these when they are imported, so set them first. The
+# osascript coprocess is disabled here; coprocess tests create their own.
+_import_dir = tempfile.mkdtemp(prefix="select_audio_output_tests.")
+os.environ["SELECT_AUDIO_OUTPUT_CACHE_DIR"] = os.path.join(_import_dir, "cache")
+os.environ["SELECT_AUDIO_OUTPUT_CONFIG"] = os.path.join(_import_dir, "config.toml")
+os.environ["SELECT_AUDIO_OUTPUT_COPROCESS"] = "0"
+
+from audio_output import applescript, backend, cache, config, devices, matching  # noqa: E402
+
+sys.path.insert(0, STUBS)
+import fakeaudio  # noqa: E402
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """Points the cache and configuration at tmp_path and resets per-process state."""
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(config, "CONFIG_FILE", str(tmp_path / "config.toml"))
+    monkeypatch.setattr(config, "_config", None)
+    monkeypatch.setattr(applescript, "_variant_stats", None)
+    monkeypatch.setattr(backend, "_capabilities", None)
+    monkeypatch.setattr(backend, "_capability_device", None)
+    monkeypatch.setattr(backend, "device_cache_ttl", backend.DEFAULT_DEVICE_CACHE_TTL)
+    monkeypatch.setattr(matching, "_device_index", None)
+    monkeypatch.setattr(devices, "_query_cache", None)
+    return tmp_path
+
+
+class FakeBackend:
+    """Reads and changes the state of the stand-in audio tools."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def state(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def set(self, **values):
+        state = self.state()
+        state.update(values)
+        with open(self.path, "w") as f:
+            json.dump(state, f)
+
+    def spawns(self, tool):
+        return self.state()["spawns"].get(tool, 0)
+
+@pytest.fixture
+def fake_backend(tmp_path, monkeypatch):
+    """Puts the stand-in tools first on PATH, with a fresh state file."""
+    path = str(tmp_path / "fakeaudio.json")
+    monkeypatch.setenv("PATH", STUBS + os.pathsep + os.environ["PATH"])
+    monkeypatch.setenv("FAKE_AUDIO_STATE", path)
+    with open(path, "w") as f:
+        json.dump(fakeaudio.DEFAULT, f)
+    return FakeBackend(path)
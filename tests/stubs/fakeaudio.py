@@ -0,0 +1,57 @@
+"""
+State shared by the stand-in osascript and SwitchAudioSource scripts.
+
+The state is a JSON file named by FAKE_AUDIO_STATE. Besides the audio state,
+it holds knobs that tests set to simulate slow or failing tools:
+
+    delays          Seconds each operation sleeps: "list", "current", "switch"
+                    (SwitchAudioSource), "osascript" (per evaluated script)
+                    and "reply" (coprocess, after evaluating, before answering)
+    coprocess_die   Number of coprocess requests that make the coprocess exit
+                    without answering
+    coprocess_hang  The coprocess never answers
+    novolume        Devices without volume support
+"""
+import fcntl
+import json
+import os
+import time
+
+STATE = os.environ.get("FAKE_AUDIO_STATE", "fakeaudio.json")
+
+DEFAULT = {
+    "devices": ["MacBook Pro Speakers", "AirPods Pro", "External Speakers", "HDMI Output"],
+    "current": "MacBook Pro Speakers",
+    "volume": 50, "input": 75, "alert": 100, "muted": False,
+    "novolume": [], "delays": {}, "coprocess_die": 0, "coprocess_hang": False,
+    "spawns": {},
+}
+
+def load():
+    try:
+        with open(STATE) as f:
+            return dict(DEFAULT, **json.load(f))
+    except FileNotFoundError:
+        return dict(DEFAULT)
+
+def update(change):
+    """Applies change(state) under a lock and returns its result."""
+    with open(STATE + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        state = load()
+        result = change(state)
+        temporary = f"{STATE}.{os.getpid()}"
+        with open(temporary, "w") as f:
+            json.dump(state, f)
+        os.replace(temporary, STATE)
+        return result
+
+def count_spawn(tool):
+    def change(state):
+        state["spawns"][tool] = state["spawns"].get(tool, 0) + 1
+    update(change)
+
+def delay(operation):
+    seconds = load()["delays"].get(operation, 0)
+    if seconds:
+        time.sleep(seconds)
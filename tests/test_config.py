@@ -0,0 +1,80 @@
+"""Tests for reading and compiling the configuration file."""
+import os
+
+import pytest
+
+from audio_output import config
+from audio_output.cache import load_cache, save_cache
+from audio_output.config import DEFAULT_MATCHING, compile_config, read_config
+
+try:
+    import tomllib  # noqa: F401
+except ImportError:
+    pytest.importorskip("tomli")
+
+def write_config(text):
+    with open(config.CONFIG_FILE, "w") as f:
+        f.write(text)
+
+def test_compiles_aliases_and_volumes():
+    compiled = compile_config({
+        "aliases": {"Buds": "AirPods Pro"},
+        "volumes": {"buds": 40},
+        "preferred": ["buds", "MacBook Pro Speakers"],
+        "matching": {"strategy": "bktree"},
+    })
+    assert compiled.aliases == {"buds": "AirPods Pro"}
+    assert compiled.volumes == {"AirPods Pro": 40}
+    assert compiled.preferred == ["AirPods Pro", "MacBook Pro Speakers"]
+    assert compiled.matching == dict(DEFAULT_MATCHING, strategy="bktree")
+
+@pytest.mark.parametrize("data", [
+    {"aliases": "x"},
+    {"volumes": ["AirPods Pro"]},
+    {"matching": 3},
+    {"aliases": {"buds": 1}},
+    {"volumes": {"AirPods Pro": 101}},
+    {"preferred": "AirPods Pro"},
+    {"matching": {"strategy": "soundex"}},
+    {"matching": {"max_distance": 3, "strategy": "symspell"}},
+    {"colors": {}},
+])
+def test_invalid_settings_raise_value_error(data):
+    with pytest.raises(ValueError):
+        compile_config(data)
+
+def test_uses_cached_compilation():
+    write_config('[aliases]\nbuds = "AirPods Pro"\n')
+    assert read_config().aliases == {"buds": "AirPods Pro"}
+    cached = load_cache(config.CONFIG_CACHE)
+    cached["config"]["aliases"] = {"buds": "From the cache"}
+    save_cache(config.CONFIG_CACHE, cached)
+    assert read_config().aliases == {"buds": "From the cache"}
+
+def test_ignores_cache_of_another_version():
+    write_config('[aliases]\nbuds = "AirPods Pro"\n')
+    info = os.stat(config.CONFIG_FILE)
+    # Written by a version without the [matching] table
+    save_cache(config.CONFIG_CACHE, {
+        "key": [config.CONFIG_FILE, info.st_mtime_ns, info.st_size],
+        "config": {"aliases": {"buds": "Stale"}, "volumes": {}, "preferred": [], "matching": {}},
+    })
+    compiled = read_config()
+    assert compiled.aliases == {"buds": "AirPods Pro"}
+    assert compiled.matching == DEFAULT_MATCHING
+
+def test_cached_matching_gets_new_defaults():
+    write_config('[matching]\ncutoff = 0.5\n')
+    read_config()
+    cached = load_cache(config.CONFIG_CACHE)
+    del cached["config"]["matching"]["strategy"]
+    save_cache(config.CONFIG_CACHE, cached)
+    assert read_config().matching == dict(DEFAULT_MATCHING, cutoff=0.5)
+
+def test_reload_keeps_previous_configuration_on_wrong_types(capsys):
+    write_config('[aliases]\nbuds = "AirPods Pro"\n')
+    config.load_config()
+    write_config('aliases = "x"\n')
+    assert config.reload_config() == []
+    assert config.load_config().aliases == {"buds": "AirPods Pro"}
+    assert "aliases must be a table" in capsys.readouterr().err
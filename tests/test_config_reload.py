@@ -0,0 +1,100 @@
+"""Tests that reloading the configuration is atomic for running commands."""
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from audio_output import config
+from audio_output.capture import call_captured
+from audio_output.devices import switch_device
+
+try:
+    import tomllib  # noqa: F401
+except ImportError:
+    pytest.importorskip("tomli")
+
+OLD = """
+[aliases]
+speaker = "AirPods Pro"
+[volumes]
+"AirPods Pro" = 11
+"HDMI Output" = 12
+"""
+
+NEW = """
+[aliases]
+speaker = "HDMI Output"
+[volumes]
+"AirPods Pro" = 21
+"HDMI Output" = 22
+"""
+
+# What a switch to "speaker" reports with the old and with the new configuration
+OUTCOMES = {
+    "Switched audio output to: AirPods Pro\nVolume set to 11%\n": "old",
+    "Switched audio output to: HDMI Output\nVolume set to 22%\n": "new",
+}
+
+def write_config(text):
+    # Replace the file like an editor does
+    temporary = config.CONFIG_FILE + ".tmp"
+    with open(temporary, "w") as f:
+        f.write(text)
+    os.replace(temporary, config.CONFIG_FILE)
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+@pytest.fixture
+def watcher(monkeypatch):
+    monkeypatch.setattr(config, "CONFIG_POLL_INTERVAL", 0.02)
+    monkeypatch.setattr(config, "CONFIG_SETTLE_DELAY", 0.01)
+    write_config(OLD)
+    config.load_config()
+    log = io.StringIO()
+    stopped = config.watch_config(log)
+    yield log
+    stopped.set()
+    time.sleep(0.1)
+
+def test_commands_see_old_or_new_configuration(watcher, fake_backend):
+    results = []
+    running = threading.Event()
+    running.set()
+
+    def switch_repeatedly():
+        while running.is_set():
+            results.append(call_captured(switch_device, "speaker"))
+
+    workers = [threading.Thread(target=switch_repeatedly) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    try:
+        # The watcher has to survive the invalid file to pick up the last one
+        for text, device in [(NEW, "HDMI Output"), ("aliases = 'x'\n", None), (OLD, "AirPods Pro")]:
+            time.sleep(0.2)
+            errors = watcher.getvalue().count("keeping the previous configuration")
+            write_config(text)
+            if device is None:
+                wait_until(lambda: watcher.getvalue().count("keeping the previous configuration") > errors)
+            else:
+                wait_until(lambda: config.load_config().aliases["speaker"] == device)
+        time.sleep(0.2)
+    finally:
+        running.clear()
+        for worker in workers:
+            worker.join()
+
+    seen = set()
+    for result in results:
+        assert result.code == 0, result.stderr
+        assert result.stdout in OUTCOMES, result.stdout
+        seen.add(OUTCOMES[result.stdout])
+    assert seen == {"old", "new"}
+    assert fake_backend.state()["current"] == "AirPods Pro"
+    assert fake_backend.state()["volume"] == 11
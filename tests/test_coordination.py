@@ -0,0 +1,108 @@
+"""Tests for coordinating commands that run at the same time."""
+import os
+import re
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from audio_output import cache, coordination
+from conftest import ROOT
+
+@pytest.fixture
+def unwritable_cache(tmp_path, monkeypatch):
+    # A path below a regular file can't be created, even by root
+    blocker = tmp_path / "blocker"
+    blocker.write_text("")
+    path = str(blocker / "cache")
+    monkeypatch.setattr(cache, "CACHE_DIR", path)
+    return path
+
+def test_reading_a_locked_cache_does_not_rewrite_it():
+    with cache.locked_cache("shared.json") as data:
+        data["count"] = 1
+    path = os.path.join(cache.CACHE_DIR, "shared.json")
+    inode = os.stat(path).st_ino
+    with cache.locked_cache("shared.json") as data:
+        assert data == {"count": 1}
+    assert os.stat(path).st_ino == inode
+    with cache.locked_cache("shared.json") as data:
+        data["count"] += 1
+    assert cache.load_cache("shared.json") == {"count": 2}
+
+def test_command_turn_runs_unordered(unwritable_cache):
+    with coordination.command_turn():
+        pass
+
+def test_single_flight_runs_the_call(unwritable_cache):
+    assert coordination.single_flight("current", lambda: "AirPods") == "AirPods"
+
+def test_volume_adjustment_applies_directly(unwritable_cache, fake_backend, capsys):
+    assert coordination.adjust_volume_coalesced(10)
+    assert fake_backend.state()["volume"] == 60
+    assert "Volume set to 60%" in capsys.readouterr().out
+    assert coordination.volume_adjustment_statistics().startswith("0 volume adjustments")
+
+@pytest.mark.parametrize("args, expected", [
+    (["-c"], "MacBook Pro Speakers"),
+    (["airpods"], "AirPods Pro"),
+    (["-u", "5"], "Volume set to 55%"),
+])
+def test_cli_works_without_a_cache_directory(unwritable_cache, fake_backend, args, expected):
+    env = dict(os.environ, SELECT_AUDIO_OUTPUT_CACHE_DIR=unwritable_cache)
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "select_audio_output.py"), "--no-daemon", *args],
+        env=env, capture_output=True, text=True, timeout=30
+    )
+    assert result.returncode == 0, result.stderr
+    assert expected in result.stdout
+
+def run_cli(*args):
+    env = dict(os.environ, SELECT_AUDIO_OUTPUT_CACHE_DIR=cache.CACHE_DIR)
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "select_audio_output.py"), "--no-daemon", *args],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+
+def test_concurrent_adjustments_are_coalesced(fake_backend):
+    # Slow writes make the later processes queue up behind the first one
+    fake_backend.set(delays={"osascript": 0.3})
+    processes = [run_cli("-u", "2") for _ in range(8)]
+    for process in processes:
+        out, err = process.communicate(timeout=60)
+        assert process.returncode == 0, err
+        assert re.search(r"Volume set to \d+%", out)
+    assert fake_backend.state()["volume"] == 66
+
+    out, _ = run_cli("--volume-stats").communicate(timeout=30)
+    adjustments, writes, saved = map(int, re.match(
+        r"(\d+) volume adjustments, (\d+) backend writes, (\d+) writes saved", out).groups())
+    assert adjustments == 8
+    assert writes < adjustments
+    assert saved == adjustments - writes
+    assert fake_backend.spawns("osascript") == writes
+
+def test_failed_write_is_handed_over(fake_backend, monkeypatch):
+    failures = [RuntimeError("backend failed")]
+    change_volume = coordination.change_volume
+
+    def flaky_change_volume(delta):
+        if failures:
+            raise failures.pop()
+        return change_volume(delta)
+
+    monkeypatch.setattr(coordination, "change_volume", flaky_change_volume)
+    with pytest.raises(RuntimeError):
+        coordination.adjust_volume_coalesced(5)
+    with coordination.coalesce_state() as state:
+        assert state["writer"] is None
+        assert state["pending"] == 5
+
+    # The next adjustment becomes the writer and applies the handed-back delta too
+    finished = []
+    worker = threading.Thread(target=lambda: finished.append(coordination.adjust_volume_coalesced(5)))
+    worker.start()
+    worker.join(timeout=10)
+    assert finished == [True]
+    assert fake_backend.state()["volume"] == 60
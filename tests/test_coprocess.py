@@ -0,0 +1,74 @@
+"""Tests for the osascript coprocess, using the stand-in osascript."""
+import subprocess
+import time
+
+import pytest
+
+from audio_output import applescript, backend
+from audio_output.applescript import CoprocessError, NoAnswerError, OsascriptCoprocess, run_applescript
+
+@pytest.fixture
+def coprocess(fake_backend, monkeypatch):
+    coprocess = OsascriptCoprocess()
+    monkeypatch.setattr(applescript, "_coprocess", coprocess)
+    yield coprocess
+    coprocess.close()
+
+def test_ok_reply(coprocess, fake_backend):
+    assert coprocess.run("output volume of (get volume settings)") == "50"
+    coprocess.run("set volume output volume 30")
+    assert fake_backend.state()["volume"] == 30
+    assert fake_backend.spawns("coprocess") == 1
+    assert fake_backend.spawns("osascript") == 0
+
+def test_err_reply_is_a_called_process_error(coprocess, fake_backend):
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        coprocess.run("not a known script")
+    assert "syntax error" in error.value.output
+    # A failing script does not cost the coprocess
+    assert coprocess.run("output muted of (get volume settings)") == "false"
+    assert fake_backend.spawns("coprocess") == 1
+
+def test_dying_mid_request_is_not_resent(coprocess, fake_backend):
+    fake_backend.set(coprocess_die=1)
+    with pytest.raises(NoAnswerError):
+        run_applescript("set volume output volume 30")
+    assert fake_backend.spawns("coprocess") == 1
+    assert fake_backend.spawns("osascript") == 0
+    # The next call restarts the coprocess instead of giving up on it
+    assert run_applescript("output volume of (get volume settings)") == "50"
+    assert applescript._coprocess is coprocess
+    assert fake_backend.spawns("coprocess") == 2
+
+def test_falls_back_to_one_shot_osascript_if_it_cannot_start(fake_backend, monkeypatch):
+    coprocess = OsascriptCoprocess(["/nonexistent/osascript"])
+    monkeypatch.setattr(applescript, "_coprocess", coprocess)
+    assert run_applescript("output volume of (get volume settings)") == "50"
+    assert fake_backend.spawns("osascript") == 1
+    # The coprocess is tried again on later calls
+    assert applescript._coprocess is coprocess
+
+def test_slow_changes_are_applied_once(coprocess, fake_backend, monkeypatch):
+    monkeypatch.setattr(applescript, "OSASCRIPT_TIMEOUT", 0.3)
+    fake_backend.set(delays={"reply": 1})
+    assert backend.adjust_volume(5) is False
+    assert backend.toggle_mute() is None
+    assert fake_backend.state()["volume"] == 55
+    assert fake_backend.state()["muted"] is True
+    assert fake_backend.spawns("osascript") == 0
+    # A slow script costs the coprocess, but not its later use
+    fake_backend.set(delays={})
+    assert backend.adjust_volume(-5) is True
+    assert fake_backend.state()["volume"] == 50
+    assert applescript._coprocess is coprocess
+
+def test_timeout_kills_the_coprocess(coprocess, fake_backend):
+    fake_backend.set(coprocess_hang=True)
+    started = time.monotonic()
+    with pytest.raises(CoprocessError):
+        coprocess.run("output volume of (get volume settings)", timeout=0.5)
+    assert time.monotonic() - started < 3
+    assert coprocess.process is None
+    fake_backend.set(coprocess_hang=False)
+    assert coprocess.run("output volume of (get volume settings)") == "50"
+    assert fake_backend.spawns("coprocess") == 2
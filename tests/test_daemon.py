@@ -0,0 +1,113 @@
+"""Tests for forwarding commands to the daemon, using the stand-in audio tools."""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from audio_output import daemon
+from conftest import ROOT
+
+SCRIPT = os.path.join(ROOT, "select_audio_output.py")
+
+def run(env, *args):
+    return subprocess.run([sys.executable, SCRIPT, *args], env=env,
+                          capture_output=True, text=True, timeout=60)
+
+@pytest.fixture
+def env(tmp_path, fake_backend):
+    return dict(
+        os.environ,
+        SELECT_AUDIO_OUTPUT_CACHE_DIR=str(tmp_path / "cache"),
+        SELECT_AUDIO_OUTPUT_CONFIG=str(tmp_path / "config.toml"),
+        SELECT_AUDIO_OUTPUT_SOCKET=str(tmp_path / "daemon.sock"),
+    )
+
+@pytest.fixture
+def running_daemon(env):
+    process = subprocess.Popen([sys.executable, SCRIPT, "--daemon"], env=env,
+                               stdout=subprocess.PIPE, text=True)
+    assert "Daemon listening" in process.stdout.readline()
+    yield env
+    process.terminate()
+    process.wait(timeout=10)
+
+class SilentServer:
+    """
+    A Unix socket server that never answers a request.
+    
+    Without the greeting, connections are not even accepted, like a daemon
+    that is stuck in another request.
+    """
+
+    def __init__(self, path, greet):
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(8)
+        self.greet = greet
+        self.connections = []
+        self.requests = []
+        if greet:
+            threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections.append(connection)
+            connection.sendall(b'{"ready": true}\n')
+            self.requests.append(connection.recv(65536))
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+        self.server.close()
+
+@pytest.fixture
+def silent_server(env, request):
+    server = SilentServer(env["SELECT_AUDIO_OUTPUT_SOCKET"], greet=request.param)
+    yield server
+    server.close()
+
+def test_daemon_runs_commands(running_daemon, fake_backend, monkeypatch):
+    for name in ("SELECT_AUDIO_OUTPUT_CACHE_DIR", "SELECT_AUDIO_OUTPUT_CONFIG", "SELECT_AUDIO_OUTPUT_SOCKET"):
+        monkeypatch.setenv(name, running_daemon[name])
+    monkeypatch.setattr(daemon, "DAEMON_SOCKET", running_daemon["SELECT_AUDIO_OUTPUT_SOCKET"])
+    answer = daemon.forward_to_daemon(["airpods"])
+    assert answer["code"] == 0, answer["stderr"]
+    assert "Switched audio output to: AirPods Pro" in answer["stdout"]
+    assert fake_backend.state()["current"] == "AirPods Pro"
+    # A client with other settings runs the command itself
+    monkeypatch.setenv("SELECT_AUDIO_OUTPUT_CONFIG", "/elsewhere.toml")
+    assert daemon.forward_to_daemon(["-c"], read_only=True) is None
+
+def test_client_environment_is_respected(running_daemon, fake_backend, tmp_path):
+    config = tmp_path / "client.toml"
+    config.write_text('[aliases]\nzz = "HDMI Output"\n')
+    result = run(dict(running_daemon, SELECT_AUDIO_OUTPUT_CONFIG=str(config)), "zz")
+    assert result.returncode == 0, result.stderr
+    assert fake_backend.state()["current"] == "HDMI Output"
+
+@pytest.mark.parametrize("silent_server", [False], indirect=True)
+@pytest.mark.parametrize("args, expected", [(["-c"], "MacBook Pro Speakers"), (["airpods"], "AirPods Pro")])
+def test_stuck_daemon_is_bypassed(env, silent_server, fake_backend, args, expected):
+    started = time.monotonic()
+    result = run(env, *args)
+    assert result.returncode == 0, result.stderr
+    assert expected in result.stdout
+    assert time.monotonic() - started < daemon.DAEMON_TIMEOUT / 2
+
+@pytest.mark.parametrize("silent_server", [True], indirect=True)
+def test_read_only_command_falls_back_when_the_answer_is_late(env, silent_server, monkeypatch):
+    monkeypatch.setattr(daemon, "DAEMON_SOCKET", env["SELECT_AUDIO_OUTPUT_SOCKET"])
+    monkeypatch.setattr(daemon, "DAEMON_READ_ONLY_TIMEOUT", 0.2)
+    monkeypatch.setattr(daemon, "DAEMON_TIMEOUT", 0.2)
+    assert daemon.forward_to_daemon(["-c"], read_only=True) is None
+    with pytest.raises(OSError):
+        daemon.forward_to_daemon(["airpods"])
+    assert b'"argv": ["airpods"]' in silent_server.requests[-1]
@@ -0,0 +1,32 @@
+"""Tests for switching devices, using the stand-in audio tools."""
+import pytest
+
+from audio_output.backend import list_devices
+from audio_output.devices import switch_device
+
+@pytest.mark.parametrize("name, expected, spawns", [
+    ("AirPods Pro", "AirPods Pro", 1),
+    ("air", "AirPods Pro", 1),
+    ("hdmi output", "HDMI Output", 1),
+    ("speakers", "External Speakers", 1),
+    # A typo might be the exact name of a device connected since
+    ("extrnal", "External Speakers", 2),
+])
+def test_warm_cache_spawns(fake_backend, capsys, name, expected, spawns):
+    list_devices()
+    before = fake_backend.spawns("SwitchAudioSource")
+    switch_device(name)
+    assert fake_backend.state()["current"] == expected
+    assert fake_backend.spawns("SwitchAudioSource") == before + spawns
+    assert f"Switched audio output to: {expected}" in capsys.readouterr().out
+
+def test_cold_cache_tries_the_exact_name_first(fake_backend):
+    switch_device("HDMI Output")
+    assert fake_backend.state()["current"] == "HDMI Output"
+    assert fake_backend.spawns("SwitchAudioSource") == 1
+
+def test_device_connected_after_caching_is_found(fake_backend):
+    list_devices()
+    fake_backend.set(devices=fake_backend.state()["devices"] + ["USB Headset"])
+    switch_device("USB Headset")
+    assert fake_backend.state()["current"] == "USB Headset"
@@ -0,0 +1,18 @@
+import pytest
+
+from audio_output.fifo import coalesce_commands, parse_fifo_command
+
+def test_fifo_commands():
+    assert parse_fifo_command("switch AirPods Pro") == ("switch", "AirPods Pro")
+    assert parse_fifo_command("vol 50") == ("set_volume", 50)
+    assert parse_fifo_command("vol -5") == ("adjust_volume", -5)
+    assert parse_fifo_command("mute") == ("mute", None)
+    with pytest.raises(ValueError):
+        parse_fifo_command("volume up")
+
+def test_fifo_bursts_are_merged():
+    commands = [("adjust_volume", 5), ("adjust_volume", 5), ("mute", None),
+                ("set_volume", 90), ("adjust_volume", 20), ("switch", "TV")]
+    assert coalesce_commands(commands) == [
+        ("adjust_volume", 10), ("mute", None), ("set_volume", 100), ("switch", "TV"),
+    ]
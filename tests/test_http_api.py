@@ -0,0 +1,161 @@
+"""Tests for the HTTP control API, using the stand-in audio tools."""
+import http.client
+import http.server
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from audio_output import coordination, http_api
+from audio_output.http_api import ControlRequestHandler, EventBroadcaster
+from conftest import ROOT
+
+@pytest.fixture
+def server(fake_backend):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ControlRequestHandler)
+    server.daemon_threads = True
+    server.events = EventBroadcaster()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def request(server, method, path, body=None, headers=None, host=None):
+    port = server.server_address[1]
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    headers = dict(headers or {})
+    connection.putrequest(method, path, skip_host=True)
+    connection.putheader("Host", f"127.0.0.1:{port}" if host is None else host)
+    data = json.dumps(body).encode("utf-8") if body is not None else b""
+    headers.setdefault("Content-Length", str(len(data)))
+    for key, value in headers.items():
+        connection.putheader(key, value)
+    connection.endheaders(data)
+    response = connection.getresponse()
+    result = response.status, json.loads(response.read())
+    connection.close()
+    return result
+
+JSON = {"Content-Type": "application/json"}
+
+def test_switch_device(server, fake_backend):
+    status, data = request(server, "POST", "/current", {"device": "airpods"}, JSON)
+    assert status == 200 and data["ok"]
+    assert fake_backend.state()["current"] == "AirPods Pro"
+    assert request(server, "GET", "/current") == (200, {"ok": True, "device": "AirPods Pro"})
+
+def test_localhost_name_is_accepted(server):
+    host = f"localhost:{server.server_address[1]}"
+    assert request(server, "GET", "/current", host=host)[0] == 200
+
+@pytest.mark.parametrize("host", ["evil.example:{port}", "127.0.0.1", "127.0.0.1:1", ""])
+def test_rejects_foreign_host(server, fake_backend, host):
+    host = host.format(port=server.server_address[1])
+    status, data = request(server, "POST", "/current", {"device": "AirPods Pro"}, JSON, host=host)
+    assert status == 403 and not data["ok"]
+    assert fake_backend.state()["current"] == "MacBook Pro Speakers"
+
+@pytest.mark.parametrize("content_type", [None, "text/plain", "application/x-www-form-urlencoded"])
+def test_post_requires_json_content_type(server, fake_backend, content_type):
+    headers = {"Content-Type": content_type} if content_type else {}
+    status, data = request(server, "POST", "/mute", headers=headers)
+    assert status == 415 and not data["ok"]
+    assert fake_backend.state()["muted"] is False
+
+def test_query_string_parameters_are_ignored(server, fake_backend):
+    status, data = request(server, "POST", "/current?device=AirPods", headers=JSON)
+    assert status == 400
+    assert fake_backend.state()["current"] == "MacBook Pro Speakers"
+
+def test_mute_without_body(server, fake_backend):
+    status, data = request(server, "POST", "/mute", headers=JSON)
+    assert status == 200 and data["muted"] is True
+    assert fake_backend.state()["muted"] is True
+
+def test_changes_wait_for_their_turn(server, fake_backend):
+    results = []
+    with coordination.command_turn():
+        # Another command is running, e.g. a CLI invocation
+        client = threading.Thread(target=lambda: results.append(request(server, "POST", "/mute", headers=JSON)))
+        client.start()
+        time.sleep(0.5)
+        assert fake_backend.state()["muted"] is False
+    client.join(timeout=10)
+    assert results[0][0] == 200
+    assert fake_backend.state()["muted"] is True
+
+def test_connections_are_kept_alive(server):
+    port = server.server_address[1]
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    sockets = []
+    for method, path, body in [("GET", "/current", None), ("POST", "/mute", b""), ("GET", "/volume", None)]:
+        connection.request(method, path, body, {"Host": f"127.0.0.1:{port}", **JSON})
+        response = connection.getresponse()
+        assert response.status == 200
+        assert json.loads(response.read())["ok"]
+        assert not response.will_close
+        sockets.append(connection.sock)
+    assert sockets[0] is not None and sockets.count(sockets[0]) == 3
+    connection.close()
+
+def read_event(response):
+    event, data = None, None
+    while True:
+        line = response.fp.readline().decode("utf-8").rstrip("\n")
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            data = json.loads(line[len("data: "):])
+        elif not line and event is not None:
+            return event, data
+
+def test_event_stream(server, fake_backend, monkeypatch):
+    # Frequent keep-alives let the server notice the closed stream quickly
+    monkeypatch.setattr(http_api, "EVENT_KEEPALIVE_INTERVAL", 0.1)
+    port = server.server_address[1]
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    connection.request("GET", "/events", headers={"Host": f"127.0.0.1:{port}"})
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.getheader("Content-Type") == "text/event-stream"
+
+    events = dict(read_event(response) for _ in range(2))
+    assert events == {
+        "device": {"device": "MacBook Pro Speakers"},
+        "volume": {"volume": 50, "muted": False},
+    }
+    # Changes made through the API are pushed right away
+    assert request(server, "POST", "/current", {"device": "AirPods Pro"}, JSON)[0] == 200
+    assert read_event(response) == ("device", {"device": "AirPods Pro"})
+    poller = server.events._thread
+    response.close()
+    connection.close()
+    # Polling stops once the last subscriber is gone
+    poller.join(timeout=10)
+    assert not poller.is_alive()
+
+def start_http_api(port):
+    return subprocess.run(
+        [sys.executable, os.path.join(ROOT, "select_audio_output.py"), "--http", str(port)],
+        capture_output=True, text=True, timeout=30
+    )
+
+def test_port_in_use_is_reported(fake_backend):
+    with socket.socket() as blocker:
+        blocker.bind(("127.0.0.1", 0))
+        blocker.listen()
+        result = start_http_api(blocker.getsockname()[1])
+    assert result.returncode == 1
+    assert result.stderr.startswith("Error starting the HTTP API on port ")
+    assert "Traceback" not in result.stderr
+
+def test_invalid_port_is_reported(fake_backend):
+    result = start_http_api(99999)
+    assert result.returncode == 1
+    assert result.stderr.startswith("Error starting the HTTP API on port 99999")
+    assert "Traceback" not in result.stderr
@@ -0,0 +1,38 @@
+"""Tests that the interactive mode runs its startup probes concurrently."""
+import time
+
+import pytest
+
+from audio_output.interactive import interactive_mode
+
+questionary = pytest.importorskip("questionary")
+
+# Seconds each stand-in tool sleeps before answering
+PROBE_DELAY = 1.0
+
+class Abort:
+    """Stands in for a questionary prompt that the user cancels."""
+
+    def ask(self):
+        return None
+
+def test_menu_appears_after_the_slowest_probe(fake_backend, monkeypatch):
+    fake_backend.set(delays={"list": PROBE_DELAY, "current": PROBE_DELAY, "osascript": PROBE_DELAY})
+    shown = {}
+
+    def select(message, choices):
+        shown["latency"] = time.monotonic() - started
+        shown["choices"] = choices
+        return Abort()
+
+    monkeypatch.setattr(questionary, "select", select)
+    started = time.monotonic()
+    with pytest.raises(SystemExit):
+        interactive_mode()
+
+    assert "MacBook Pro Speakers (active)" in shown["choices"]
+    assert "-- Toggle mute --" in shown["choices"]
+    # One probe of each kind ran; sequential probes would take three delays
+    assert fake_backend.spawns("SwitchAudioSource") == 2
+    assert fake_backend.spawns("osascript") == 1
+    assert PROBE_DELAY <= shown["latency"] < 2 * PROBE_DELAY
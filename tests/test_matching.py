@@ -0,0 +1,156 @@
+import difflib
+import random
+
+import pytest
+
+from audio_output import devices as devices_module
+from audio_output.devices import device_fingerprint, find_closest_device
+from audio_output.matching import (
+    BKTree, DeletionIndex, DeviceIndex, bounded_levenshtein, levenshtein, normalize_device_name
+)
+
+DEVICES = [
+    "MacBook Pro Speakers", "AirPods Pro", "AirPlay Living Room", "External Speakers",
+    "HDMI Display", "Chair Speaker", "BlackHole 2ch", "BlackHole 16ch",
+    "Loopback Audio", "Studio Display Speakers",
+]
+
+WORDS = ["MacBook", "Pro", "Speakers", "AirPods", "HDMI", "Loopback", "BlackHole", "2ch",
+         "Aggregate", "Device", "Studio", "Display", "AirPlay", "Living", "Room", "USB"]
+
+def linear_substring(name, devices):
+    name_lower = name.lower()
+    return [device for device in devices if name_lower in device.lower()]
+
+def linear_fuzzy(name, devices, cutoff=0.3):
+    matches = difflib.get_close_matches(name, devices, n=3, cutoff=cutoff)
+    return matches[0] if matches else None
+
+def typo(rng, text):
+    chars = list(text)
+    for _ in range(rng.randint(0, 3)):
+        if not chars:
+            break
+        position = rng.randrange(len(chars))
+        operation = rng.randrange(3)
+        if operation == 0:
+            del chars[position]
+        elif operation == 1:
+            chars[position] = rng.choice("abcdefghijklmnopqrstuvwxyzABC")
+        else:
+            chars.insert(position, rng.choice("abcdefghijklmnopqrstuvwxyz"))
+    return "".join(chars)
+
+def test_exact_match_ignores_case():
+    assert find_closest_device("airpods pro", DEVICES) == "AirPods Pro"
+
+def test_prefix_prefers_full_name_then_shorter_word_match():
+    assert find_closest_device("air", DEVICES) == "AirPods Pro"
+    assert find_closest_device("liv", DEVICES) == "AirPlay Living Room"
+    assert find_closest_device("speak", DEVICES) == "Chair Speaker"
+
+def test_substring_picks_shortest():
+    assert find_closest_device("ck", DEVICES) == "BlackHole 2ch"
+
+def test_fuzzy_corrects_typos():
+    assert find_closest_device("MacBok Spekers", DEVICES) == "MacBook Pro Speakers"
+    assert find_closest_device("zzzzzzzzzzzzzzzz", DEVICES) is None
+
+def test_index_agrees_with_linear_scans():
+    rng = random.Random(7)
+    for size in (1, 5, 40, 300):
+        devices = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) for _ in range(size)]
+        index = DeviceIndex(devices)
+        for _ in range(40):
+            query = typo(rng, rng.choice(devices))
+            assert index.containing(query.lower()) == linear_substring(query, devices)
+            assert index.closest(query, 0.3, vectorize=False) == linear_fuzzy(query, devices)
+
+def test_vectorized_closest_agrees_with_difflib():
+    pytest.importorskip("numpy")
+    rng = random.Random(5)
+    devices = sorted({" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) for _ in range(800)})
+    assert len(devices) >= 500
+    index = DeviceIndex(devices)
+    queries = [typo(rng, rng.choice(devices)) for _ in range(40)] + ["", "zzzz", "airpod"]
+    for query in queries:
+        for cutoff in (0.0, 0.3, 0.6, 0.8, 1.0):
+            assert index.closest_vectorized(query, cutoff) == linear_fuzzy(query, devices, cutoff), (query, cutoff)
+
+def test_levenshtein_examples():
+    assert levenshtein("", "") == 0
+    assert levenshtein("kitten", "sitting") == 3
+    assert levenshtein("flaw", "lawn") == 2
+    assert levenshtein("airpods", "") == 7
+
+def test_bounded_levenshtein_agrees_within_limit():
+    rng = random.Random(3)
+    for _ in range(500):
+        a = typo(rng, rng.choice(WORDS))
+        b = typo(rng, rng.choice(WORDS + [a]))
+        distance = levenshtein(a, b)
+        for limit in range(5):
+            assert bounded_levenshtein(a, b, limit) == min(distance, limit + 1)
+
+def test_bktree_agrees_with_brute_force():
+    rng = random.Random(11)
+    names = list({typo(rng, " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))) for _ in range(400)})
+    tree = BKTree(names)
+    for _ in range(100):
+        query = typo(rng, rng.choice(names))
+        distances = sorted((levenshtein(query, name), name) for name in names)
+        for max_distance in range(4):
+            expected = [(distance, name) for distance, name in distances if distance <= max_distance]
+            assert tree.search(query, max_distance) == expected
+
+def test_deletion_index_agrees_with_brute_force():
+    rng = random.Random(13)
+    # Long words exercise the prefix the index stores instead of the whole word
+    words = list({typo(rng, rng.choice(WORDS) + rng.choice(["", "", "Speakers", "Output"])) for _ in range(300)})
+    index = DeletionIndex(words)
+    for _ in range(100):
+        query = typo(rng, rng.choice(words))
+        distances = sorted((levenshtein(query, word), word) for word in words)
+        for max_distance in range(3):
+            expected = [(distance, word) for distance, word in distances if distance <= max_distance]
+            assert index.lookup(query, max_distance) == expected, (query, max_distance)
+
+def brute_force_corrected(name, devices, max_distance):
+    query = normalize_device_name(name)
+    best = None
+    for position, device in enumerate(devices):
+        normalized = normalize_device_name(device)
+        terms = [(normalized, False)] + [(word, True) for word in normalized.split()]
+        for term, is_word in terms:
+            distance = levenshtein(query, term)
+            key = (distance, is_word, len(device), position)
+            if distance <= max_distance and (best is None or key < best):
+                best = key
+    return devices[best[-1]] if best else None
+
+def test_corrected_agrees_with_brute_force():
+    rng = random.Random(17)
+    devices = list({" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))) for _ in range(200)})
+    index = DeviceIndex(devices)
+    for _ in range(100):
+        source = rng.choice(devices)
+        query = typo(rng, rng.choice([source, rng.choice(source.split())]))
+        for max_distance in range(3):
+            assert index.corrected(query, max_distance) == brute_force_corrected(query, devices, max_distance), \
+                (query, max_distance)
+
+def test_corrected_prefers_full_name_over_word():
+    # Both are one edit away and equally long; the word match comes first
+    devices = ["KitchenPad 1", "Kitchen Pads"]
+    assert DeviceIndex(devices).corrected("kitchen pad", 1) == "Kitchen Pads"
+    # Fewer edits still win over the kind of match
+    assert DeviceIndex(devices).corrected("kitchenpad", 1) == "KitchenPad 1"
+
+def test_prefix_wins_over_shorter_substring_match():
+    assert find_closest_device("air", ["Chair Speaker", "AirPods Pro Max"]) == "AirPods Pro Max"
+
+def test_fingerprint_includes_algorithm_version(monkeypatch):
+    fingerprint = device_fingerprint(DEVICES)
+    assert device_fingerprint(list(reversed(DEVICES))) == fingerprint
+    monkeypatch.setattr(devices_module, "MATCHING_ALGORITHM_VERSION", devices_module.MATCHING_ALGORITHM_VERSION + 1)
+    assert device_fingerprint(DEVICES) != fingerprint
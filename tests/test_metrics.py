@@ -0,0 +1,27 @@
+from audio_output.metrics import MetricsRegistry
+
+def test_render_counters_gauges_and_histograms():
+    registry = MetricsRegistry()
+    registry.describe("requests_total", "counter", "Requests.")
+    registry.describe("entries", "gauge", "Entries.")
+    registry.describe("duration_seconds", "histogram", "Duration.")
+    registry.inc("requests_total", cache="devices", result="hit")
+    registry.inc("requests_total", 2, cache="devices", result="hit")
+    registry.set("entries", 42)
+    registry.observe("duration_seconds", 0.02, operation="list")
+    registry.observe("duration_seconds", 3.0, operation="list")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{cache="devices",result="hit"} 3' in lines
+    assert "entries 42" in lines
+    assert 'duration_seconds_bucket{operation="list",le="0.01"} 0' in lines
+    assert 'duration_seconds_bucket{operation="list",le="0.025"} 1' in lines
+    assert 'duration_seconds_bucket{operation="list",le="+Inf"} 2' in lines
+    assert 'duration_seconds_count{operation="list"} 2' in lines
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.describe("strategy_total", "counter", "Strategies.")
+    registry.inc("strategy_total", device='say "hi"\n')
+    assert 'strategy_total{device="say \\"hi\\"\\n"} 1' in registry.render()
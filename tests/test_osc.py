@@ -0,0 +1,61 @@
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from audio_output import osc
+from audio_output.capture import CapturedCall
+from audio_output.osc import OscListener, parse_osc_packet
+from conftest import ROOT
+
+def osc_string(text):
+    data = text.encode("utf-8") + b"\0"
+    return data + b"\0" * (-len(data) % 4)
+
+def osc_message(address, tags, *payload):
+    return osc_string(address) + osc_string("," + tags) + b"".join(payload)
+
+def test_osc_message_and_bundle():
+    volume = osc_message("/volume", "f", struct.pack(">f", 0.5))
+    device = osc_message("/device", "s", osc_string("AirPods"))
+    assert list(parse_osc_packet(volume)) == [("/volume", [0.5])]
+
+    bundle = osc_string("#bundle") + b"\0" * 8
+    for message in (volume, device):
+        bundle += struct.pack(">i", len(message)) + message
+    assert list(parse_osc_packet(bundle)) == [("/volume", [0.5]), ("/device", ["AirPods"])]
+
+def test_osc_rejects_malformed_packets():
+    with pytest.raises(ValueError):
+        list(parse_osc_packet(osc_message("/volume", "f", b"\0")))
+    with pytest.raises(ValueError):
+        list(parse_osc_packet(osc_message("/volume", "x")))
+
+@pytest.mark.parametrize("address", ["99999", "127.0.0.1:-1", "localhost:port"])
+def test_invalid_address_is_reported(address):
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "select_audio_output.py"), "--osc", address],
+        capture_output=True, text=True, timeout=30
+    )
+    assert result.returncode == 1
+    assert result.stderr.startswith(f"Error starting the OSC listener on {address}")
+    assert "Traceback" not in result.stderr
+
+def test_latency_samples_are_bounded(monkeypatch):
+    monkeypatch.setattr(osc, "OSC_LATENCY_SAMPLES", 3)
+    listener = OscListener("127.0.0.1", 0)
+    monkeypatch.setattr(listener, "apply", lambda address, arguments: CapturedCall(None, "", "", 0))
+    threading.Thread(target=listener.work, daemon=True).start()
+    for _ in range(10):
+        listener.enqueue("/mute", [])
+    deadline = time.monotonic() + 10
+    while listener.applied < 10 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    listener.socket.close()
+    assert len(listener.latencies) == 3
+    assert "10 applied" in listener.statistics()
+    assert "End-to-end latency" in listener.statistics()
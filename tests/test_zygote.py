@@ -0,0 +1,157 @@
+"""Tests for the zygote, using the stand-in audio tools."""
+import fcntl
+import os
+import pty
+import select
+import signal
+import subprocess
+import sys
+import termios
+import time
+
+import pytest
+
+from conftest import ROOT
+
+SCRIPT = os.path.join(ROOT, "select_audio_output.py")
+
+@pytest.fixture
+def zygote(tmp_path, fake_backend):
+    env = dict(
+        os.environ,
+        SELECT_AUDIO_OUTPUT_CACHE_DIR=str(tmp_path / "cache"),
+        SELECT_AUDIO_OUTPUT_CONFIG=str(tmp_path / "config.toml"),
+        SELECT_AUDIO_OUTPUT_ZYGOTE_SOCKET=str(tmp_path / "zygote.sock"),
+    )
+    process = subprocess.Popen([sys.executable, SCRIPT, "--zygote"], env=env,
+                               stdout=subprocess.PIPE, text=True)
+    assert "Zygote listening" in process.stdout.readline()
+    yield env, process.pid
+    process.terminate()
+    process.wait(timeout=10)
+
+def run(env, *args):
+    return subprocess.run([sys.executable, SCRIPT, *args], env=env,
+                          capture_output=True, text=True, timeout=30)
+
+def process_state(pid):
+    """Returns the parent pid and the state letter of a process, read from /proc."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return int(fields[1]), fields[0]
+
+def children(parent):
+    pids = []
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            if process_state(pid)[0] == parent:
+                pids.append(int(pid))
+        except OSError:
+            pass
+    return pids
+
+def test_runs_commands(zygote, fake_backend):
+    result = run(zygote[0], "-c")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "MacBook Pro Speakers"
+
+def test_client_environment_is_respected(zygote, fake_backend, tmp_path):
+    config = tmp_path / "client.toml"
+    config.write_text('[aliases]\nzz = "HDMI Output"\n')
+    result = run(dict(zygote[0], SELECT_AUDIO_OUTPUT_CONFIG=str(config)), "zz")
+    assert result.returncode == 0, result.stderr
+    assert fake_backend.state()["current"] == "HDMI Output"
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="reads process states from /proc")
+def test_suspend_stops_the_child(zygote, fake_backend):
+    env, zygote_pid = zygote
+    fake_backend.set(delays={"current": 1})
+    client = subprocess.Popen([sys.executable, SCRIPT, "-c"], env=env,
+                              stdout=subprocess.PIPE, text=True)
+    time.sleep(0.5)
+    client.send_signal(signal.SIGTSTP)
+    time.sleep(0.5)
+    (child,) = children(zygote_pid)
+    assert process_state(client.pid)[1] == "T"
+    assert process_state(child)[1] == "T"
+    client.send_signal(signal.SIGCONT)
+    output, _ = client.communicate(timeout=30)
+    assert client.returncode == 0
+    assert output.strip() == "MacBook Pro Speakers"
+
+def test_stopped_zygote_is_bypassed(zygote, fake_backend):
+    env, zygote_pid = zygote
+    os.kill(zygote_pid, signal.SIGSTOP)
+    try:
+        started = time.monotonic()
+        result = run(env, "-c")
+        assert time.monotonic() - started < 10
+    finally:
+        os.kill(zygote_pid, signal.SIGCONT)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "MacBook Pro Speakers"
+
+class Terminal:
+    """An interactive shell with job control on a pseudo-terminal."""
+
+    def __init__(self, env):
+        self.master, slave = pty.openpty()
+
+        def become_terminal_owner():
+            os.setsid()
+            fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+        self.shell = subprocess.Popen(
+            ["bash", "--norc", "--noprofile", "-i"], cwd=ROOT, env=dict(env, PS1="$ ", TERM="xterm"),
+            stdin=slave, stdout=slave, stderr=slave, preexec_fn=become_terminal_owner
+        )
+        os.close(slave)
+        self.output = b""
+
+    def type(self, text):
+        os.write(self.master, text.encode("utf-8"))
+
+    def wait_for(self, text, timeout=20):
+        deadline = time.monotonic() + timeout
+        while text.encode("utf-8") not in self.output:
+            remaining = deadline - time.monotonic()
+            assert remaining > 0, f"{text!r} did not appear in {self.output[-500:]!r}"
+            if select.select([self.master], [], [], remaining)[0]:
+                self.output += os.read(self.master, 65536)
+
+    def close(self):
+        # Also stop the background jobs, which run in the shell's session
+        for pid in map(int, filter(str.isdigit, os.listdir("/proc"))):
+            try:
+                if os.getsid(pid) == self.shell.pid:
+                    os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self.shell.wait()
+        os.close(self.master)
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="finds the background jobs in /proc")
+def test_interactive_mode_through_background_zygote(tmp_path, fake_backend):
+    env = dict(
+        os.environ,
+        SELECT_AUDIO_OUTPUT_CACHE_DIR=str(tmp_path / "cache"),
+        SELECT_AUDIO_OUTPUT_CONFIG=str(tmp_path / "config.toml"),
+        SELECT_AUDIO_OUTPUT_ZYGOTE_SOCKET=str(tmp_path / "zygote.sock"),
+    )
+    terminal = Terminal(env)
+    try:
+        # Started like the README says
+        terminal.type("./select_audio_output.py --zygote &\n")
+        terminal.wait_for("Zygote listening")
+        terminal.type("./select_audio_output.py -i\n")
+        terminal.wait_for("Please select audio output device")
+        # Select the second device
+        terminal.type("\x1b[B")
+        time.sleep(0.2)
+        terminal.type("\r")
+        terminal.wait_for("Switched audio output to: AirPods Pro")
+        terminal.type("echo exit code $?\n")
+        terminal.wait_for("exit code 0")
+        assert fake_backend.state()["current"] == "AirPods Pro"
+    finally:
+        terminal.close()